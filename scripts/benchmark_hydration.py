@@ -0,0 +1,56 @@
+import argparse
+import timeit
+from datetime import datetime
+from src.entities.database_entity import DatabaseEntity
+from src.entities.message import Message
+from src.entities.room import Room
+from src.entities.user import User
+
+parser = argparse.ArgumentParser(description='Measure the hydration cost per entity type with and without trusted hydration.')
+parser.add_argument('--iterations', type=int, default=20000, help='The amount of hydrations per measurement.')
+parser.add_argument('--friends', type=int, default=50, help='The amount of friends of the benchmarked user.')
+
+args = parser.parse_args()
+
+# Documents shaped like they come back from the database
+def user_document() -> dict:
+    now = datetime.now()
+    user = User.new(name="Benchmark")
+    user.id = "6620f2a9d2c1b4a0f1e2d3c4"
+    user.used_endpoints = {f"endpoint-{i}": i for i in range(20)}
+    user.friends = {f"{i:032x}": now for i in range(args.friends)}
+    user.friend_requests = {f"{i:032x}": now for i in range(args.friends // 5)}
+    user.e2ee.set_up(public_key="public" * 50, private_key="private" * 200, salt_hex="ab" * 16)
+    return user.get_document() | {"id": user.id}
+
+def room_document() -> dict:
+    room = Room(id="6620f2a9d2c1b4a0f1e2d3c5", code="ABCDEF", owner_key="1" * 32, opponent_key="2" * 32, owner_ready=True)
+    return room.get_document() | {"id": room.id}
+
+def message_document() -> dict:
+    message = Message(id="6620f2a9d2c1b4a0f1e2d3c6", content="x" * 256, sender_key="1" * 32, receiver_key="2" * 32, sent_stamp=int(datetime.now().timestamp()))
+    return message.get_document() | {"id": message.id}
+
+def measure(entity_class: type[DatabaseEntity], document: dict) -> None:
+    validate = timeit.timeit(lambda: entity_class.model_validate(document), number=args.iterations)
+    construct = timeit.timeit(lambda: entity_class.model_construct(**document), number=args.iterations)
+    trusted_hydration = entity_class.TRUSTED_HYDRATION
+    entity_class.TRUSTED_HYDRATION = False
+    untrusted = timeit.timeit(lambda: entity_class.from_document(document), number=args.iterations)
+    entity_class.TRUSTED_HYDRATION = True
+    trusted = timeit.timeit(lambda: entity_class.from_document(document), number=args.iterations)
+    entity_class.TRUSTED_HYDRATION = trusted_hydration
+    print(
+        f"{entity_class.__name__:<10}"
+        f"{validate / args.iterations * 1e6:>16.2f}"
+        f"{construct / args.iterations * 1e6:>17.2f}"
+        f"{untrusted / args.iterations * 1e6:>12.2f}"
+        f"{trusted / args.iterations * 1e6:>12.2f}"
+        f"{untrusted / trusted:>10.2f}x"
+    )
+
+print("Microseconds per entity, hydration includes the change tracking snapshot.")
+print(f"{'Entity':<10}{'model_validate':>16}{'model_construct':>17}{'untrusted':>12}{'trusted':>12}{'speedup':>11}")
+measure(User, user_document())
+measure(Room, room_document())
+measure(Message, message_document())
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import time
+from src.database.backends.memory_backend import MemoryBackend
+from src.database.collection import Collection
+from src.database.database import Database
+from src.entities.room import CODE_CHARACTERS, Room, generate_code
+
+parser = argparse.ArgumentParser(description='Measure room code allocation latency as the code space fills up.')
+parser.add_argument('--code-length', type=int, default=3, help='The code length, shorter codes make collisions observable.')
+parser.add_argument('--latency-ms', type=float, default=0.5, help='Simulated database round trip per operation.')
+parser.add_argument('--samples', type=int, default=200, help='The amount of allocations measured per occupancy level.')
+parser.add_argument('--occupancy', type=float, nargs='+', default=[0.0, 0.25, 0.5, 0.75, 0.9, 0.95], help='Occupied fractions of the code space.')
+
+args = parser.parse_args()
+
+# The in-memory engine with a fixed delay per round trip, standing in for MongoDB
+class LatencyBackend(MemoryBackend):
+    def __init__(self) -> None:
+        super().__init__()
+        self.round_trips = 0
+
+    async def round_trip(self) -> None:
+        self.round_trips += 1
+        await asyncio.sleep(args.latency_ms / 1000)
+
+    async def count(self, collection: str, filter: dict, limit: int = 0) -> int:
+        await self.round_trip()
+        return await super().count(collection, filter, limit)
+
+    async def insert_one(self, collection: str, document: dict) -> str:
+        await self.round_trip()
+        return await super().insert_one(collection, document)
+
+# The previous allocation: probe random codes until one is free, then insert
+async def allocate_probing() -> None:
+    while True:
+        code = generate_code(length=args.code_length)
+        if not await Room.exists(code=code):
+            await Room(owner_key="benchmark", code=code).save()
+            return
+
+async def allocate_inserting() -> None:
+    room = Room(owner_key="benchmark", code=generate_code(length=args.code_length))
+    await room.insert_with_unique_code(code_length=args.code_length, max_attempts=1000000)
+
+async def fill(backend: LatencyBackend, target: int) -> None:
+    documents = backend.get_collection(Collection.ROOMS.value)
+    while len(documents) < target:
+        code = generate_code(length=args.code_length)
+        try:
+            await MemoryBackend.insert_one(backend, Collection.ROOMS.value, Room(owner_key="filler", code=code).get_document())
+        except RuntimeError:
+            pass
+
+async def measure(allocate, occupancy: float) -> tuple[float, float]:
+    backend = LatencyBackend()
+    Database.get_instance().use_backend(backend)
+    await Room.create_indexes()
+    code_space = len(CODE_CHARACTERS) ** args.code_length
+    await fill(backend=backend, target=int(code_space * occupancy))
+
+    backend.round_trips = 0
+    start = time.perf_counter()
+    for _ in range(args.samples):
+        await allocate()
+    elapsed = time.perf_counter() - start
+    return elapsed / args.samples * 1000, backend.round_trips / args.samples
+
+async def main() -> None:
+    print(f"Code space: {len(CODE_CHARACTERS) ** args.code_length} codes, {args.latency_ms} ms per round trip")
+    print(f"{'Occupancy':<12}{'probe ms':>12}{'probe trips':>14}{'insert ms':>12}{'insert trips':>15}")
+    for occupancy in args.occupancy:
+        probe_latency, probe_trips = await measure(allocate_probing, occupancy)
+        insert_latency, insert_trips = await measure(allocate_inserting, occupancy)
+        print(f"{occupancy:<12.2f}{probe_latency:>12.2f}{probe_trips:>14.2f}{insert_latency:>12.2f}{insert_trips:>15.2f}")
+
+asyncio.run(main())
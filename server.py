@@ -1,22 +1,65 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
-from src.resources import e2ee, friend, ping, pm, room, user
+from src.database.database import Database
+from src.entities.config import Config
+from src.entities.database_entity import DatabaseEntity
+from src.resources import e2ee, friend, inbox, matchmaking, ping, pm, room, user
+from src.services.endpoint_usage import EndpointUsageTracker
+from src.services.message_writer import MessageWriter
+from src.services.pm_hub import PmHub
+from src.services.room_store import RoomStore
+from src.services.room_sweeper import RoomSweeper
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    config = Config.load_state()
+    database = Database.get_instance()
+    database.connect(config=config)
+    await database.warm_up(connections=config.db_min_pool_size)
+    await DatabaseEntity.create_indexes(config=config)
+    usage_tracker = EndpointUsageTracker.get_instance()
+    usage_tracker.start(interval=config.usage_flush_interval)
+    pm_hub = PmHub.get_instance()
+    await pm_hub.start()
+    message_writer = MessageWriter.get_instance()
+    message_writer.start()
+    room_store = RoomStore.get_instance()
+    # Rooms changed by other processes are only seen in the database, so with a shared backplane the store writes through
+    room_store.start(interval=config.room_store_flush_interval, write_through=config.pm_backplane != "local")
+    room_sweeper = RoomSweeper.get_instance()
+    room_sweeper.start(
+        interval=config.room_sweep_interval,
+        idle_timeout=config.room_idle_timeout,
+        unfilled_timeout=config.room_unfilled_timeout
+    )
+    yield
+    room_sweeper.stop()
+    await room_store.stop()
+    await pm_hub.stop()
+    await message_writer.stop()
+    await usage_tracker.stop()
+    database.close()
 
 api = FastAPI(
     title="LemonTCG Multiplayer API",
     description="The API enabling multiplayer features for LemonTCG.",
     version="0.1.1",
     docs_url="/swagger",
-    redoc_url="/docs"
+    redoc_url="/docs",
+    lifespan=lifespan
 )
 
 api.include_router(e2ee.router)
 api.include_router(friend.router)
+api.include_router(inbox.router)
+api.include_router(matchmaking.router)
 api.include_router(ping.router)
 api.include_router(pm.router)
 api.include_router(room.router)
+api.include_router(room.websocket_router)
 api.include_router(user.router)
 
 @api.get("/", include_in_schema=False)
 async def root():
-    return RedirectResponse(url="/docs")
\ No newline at end of file
+    return RedirectResponse(url="/docs")
@@ -0,0 +1,74 @@
+from typing import Optional
+from src.entities.config import Config
+from src.entities.database_entity import DatabaseEntity
+from src.entities.user import User
+from src.utils.lru_cache import LRUCache
+
+MAX_KEY_LENGTH = 128
+
+# Caches the documents of authenticated users by api key, so resolving a known key needs no database query.
+# Entries are dropped whenever the user is written or deleted through its entity in this process,
+# writes of other workers are only seen once the entry expires.
+# Keys which matched no user are cached as well, so floods of invalid keys are rejected in memory.
+class AuthCache():
+    _instance = None
+
+    def __init__(self) -> None:
+        if AuthCache._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of AuthCache.")
+        config = Config.load_state()
+        self.users = LRUCache(max_size=config.auth_cache_size, ttl=config.auth_cache_ttl)
+        self.invalid_keys = LRUCache(max_size=config.auth_negative_cache_size, ttl=config.auth_negative_cache_ttl)
+        # Keys which are being loaded with their number of loads and the number of invalidations since the loads started
+        self.loads: dict[str, int] = {}
+        self.generations: dict[str, int] = {}
+        User.on_write(self.invalidate_user)
+
+    @staticmethod
+    def get_instance() -> 'AuthCache':
+        if AuthCache._instance is None:
+            AuthCache._instance = AuthCache()
+        return AuthCache._instance
+    
+    async def get_user(self, key: Optional[str]) -> Optional[User]:
+        if not isinstance(key, str) or len(key) == 0 or len(key) > MAX_KEY_LENGTH:
+            return None
+        document = self.users.get(key)
+        if document is not None:
+            return User.load(document)
+        if self.invalid_keys.get(key) is not None:
+            return None
+
+        generation = self.begin_load(key)
+        try:
+            user = await User.find_one(key=key)
+        finally:
+            stale = self.end_load(key=key, generation=generation)
+        # The user was written while it was loaded, the loaded document might be outdated
+        if stale:
+            return user
+        if isinstance(user, User):
+            self.users.put(key, user.get_document() | {"id": user.id})
+        else:
+            self.invalid_keys.put(key, True)
+        return user
+    
+    def begin_load(self, key: str) -> int:
+        self.loads[key] = self.loads.get(key, 0) + 1
+        return self.generations.get(key, 0)
+
+    # Returns if the key was invalidated since the load began
+    def end_load(self, key: str, generation: int) -> bool:
+        stale = self.generations.get(key, 0) != generation
+        self.loads[key] -= 1
+        if self.loads[key] == 0:
+            del self.loads[key]
+            self.generations.pop(key, None)
+        return stale
+
+    def invalidate_user(self, user: DatabaseEntity) -> None:
+        if isinstance(user, User):
+            self.users.invalidate(user.key)
+            self.invalid_keys.invalidate(user.key)
+            if user.key in self.loads:
+                self.generations[user.key] = self.generations.get(user.key, 0) + 1
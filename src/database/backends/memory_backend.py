@@ -0,0 +1,346 @@
+from bson import ObjectId
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+from src.database.backends.storage_backend import StorageBackend
+from src.database.errors import UniqueKeyError
+from src.database.index import Index
+from src.entities.config import Config
+
+# Marks a field path which doesn't exist in a document
+MISSING = object()
+
+# An in-process storage engine implementing the subset of MongoDB semantics used by the server:
+# equality, comparison, $in/$nin/$exists and logical filters, sorting, inclusion projections,
+# $set/$unset/$inc/$min/$max updates and unique indexes. Documents are copied on every read and
+# write, so callers can never modify stored documents by accident.
+class MemoryBackend(StorageBackend):
+    def __init__(self) -> None:
+        self.collections: dict[str, dict[ObjectId, dict]] = {}
+        self.indexes: dict[str, dict[str, Index]] = {}
+        # Per collection and unique index: the indexed values mapped to the id of the owning document
+        self.unique_values: dict[str, dict[str, dict[tuple, ObjectId]]] = {}
+
+    def connect(self, config: Config) -> None:
+        pass
+
+    async def warm_up(self, connections: int) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def get_collection(self, collection: str) -> dict[ObjectId, dict]:
+        return self.collections.setdefault(collection, {})
+    
+    def get_unique_indexes(self, collection: str) -> list[Index]:
+        return [index for index in self.indexes.get(collection, {}).values() if index.unique]
+
+    async def create_indexes(self, collection: str, indexes: list[Index]) -> None:
+        existing = self.indexes.setdefault(collection, {})
+        unique_values = self.unique_values.setdefault(collection, {})
+        for index in indexes:
+            name = index.get_name()
+            if existing.get(name, None) == index:
+                continue
+            unique_values.pop(name, None)
+            if index.unique:
+                values: dict[tuple, ObjectId] = {}
+                for document_id, document in self.get_collection(collection).items():
+                    key = get_index_key(document, index)
+                    if key in values:
+                        raise unique_violation(index=index, key=key)
+                    values[key] = document_id
+                unique_values[name] = values
+            existing[name] = index
+
+    async def find_one(self, collection: str, filter: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        for document in self.find_candidates(collection=collection, filter=filter):
+            if matches(document, filter):
+                return project(document, projection)
+        return None
+
+    async def find(
+            self,
+            collection: str,
+            filter: dict,
+            projection: Optional[dict] = None,
+            sort: Optional[list[tuple[str, int]]] = None,
+            limit: int = 0,
+            batch_size: int = 100
+        ) -> AsyncIterator[dict]:
+        documents = [document for document in self.find_candidates(collection=collection, filter=filter) if matches(document, filter)]
+        if isinstance(sort, list):
+            for field, direction in reversed(sort):
+                documents.sort(key=lambda document: sort_key(get_path(document, field)), reverse=direction < 0)
+        if limit > 0:
+            documents = documents[:limit]
+        for document in documents:
+            yield project(document, projection)
+
+    async def count(self, collection: str, filter: dict, limit: int = 0) -> int:
+        count = 0
+        for document in self.find_candidates(collection=collection, filter=filter):
+            if matches(document, filter):
+                count += 1
+                if count == limit:
+                    break
+        return count
+
+    async def insert_one(self, collection: str, document: dict) -> str:
+        document = copy_value(document)
+        document_id = document.setdefault("_id", ObjectId())
+        documents = self.get_collection(collection)
+        if document_id in documents:
+            raise UniqueKeyError(key="_id", value=document_id)
+        self.update_unique_values(collection=collection, document_id=document_id, old=None, new=document)
+        documents[document_id] = document
+        return str(document_id)
+
+    async def insert_many(self, collection: str, documents: list[dict]) -> list[str]:
+        return [await self.insert_one(collection=collection, document=document) for document in documents]
+
+    async def update_one(self, collection: str, filter: dict, update: dict) -> None:
+        for document in self.find_candidates(collection=collection, filter=filter):
+            if matches(document, filter):
+                updated = apply_update(copy_value(document), update)
+                self.update_unique_values(collection=collection, document_id=document["_id"], old=document, new=updated)
+                self.get_collection(collection)[document["_id"]] = updated
+                return
+
+    async def update_many(self, collection: str, filter: dict, update: dict) -> int:
+        documents = [document for document in self.find_candidates(collection=collection, filter=filter) if matches(document, filter)]
+        for document in documents:
+            updated = apply_update(copy_value(document), update)
+            self.update_unique_values(collection=collection, document_id=document["_id"], old=document, new=updated)
+            self.get_collection(collection)[document["_id"]] = updated
+        return len(documents)
+
+    async def bulk_update(self, collection: str, operations: list[tuple[dict, dict]]) -> None:
+        for filter, update in operations:
+            await self.update_one(collection=collection, filter=filter, update=update)
+
+    async def delete_one(self, collection: str, filter: dict) -> None:
+        for document in self.find_candidates(collection=collection, filter=filter):
+            if matches(document, filter):
+                self.update_unique_values(collection=collection, document_id=document["_id"], old=document, new=None)
+                del self.get_collection(collection)[document["_id"]]
+                return
+
+    async def delete_many(self, collection: str, filter: dict) -> int:
+        documents = [document for document in self.find_candidates(collection=collection, filter=filter) if matches(document, filter)]
+        for document in documents:
+            self.update_unique_values(collection=collection, document_id=document["_id"], old=document, new=None)
+            del self.get_collection(collection)[document["_id"]]
+        return len(documents)
+
+    # Narrow down the documents to check using the id or a unique index, falls back to a full scan
+    def find_candidates(self, collection: str, filter: dict) -> list[dict]:
+        documents = self.get_collection(collection)
+        document_id = filter.get("_id", None)
+        if isinstance(document_id, ObjectId):
+            document = documents.get(document_id, None)
+            return [document] if document is not None else []
+        for index in self.get_unique_indexes(collection):
+            if len(index.fields) != 1:
+                continue
+            value = filter.get(index.fields[0][0], MISSING)
+            if value is MISSING or isinstance(value, (dict, list)):
+                continue
+            document_id = self.unique_values[collection][index.get_name()].get((freeze(value),), None)
+            return [documents[document_id]] if document_id is not None else []
+        return list(documents.values())
+
+    # Check the unique indexes for the new version of a document and move its index entries
+    def update_unique_values(self, collection: str, document_id: ObjectId, old: Optional[dict], new: Optional[dict]) -> None:
+        changes = []
+        for index in self.get_unique_indexes(collection):
+            values = self.unique_values[collection][index.get_name()]
+            old_key = get_index_key(old, index) if old is not None else None
+            new_key = get_index_key(new, index) if new is not None else None
+            if old_key == new_key:
+                continue
+            if new_key is not None and values.get(new_key, document_id) != document_id:
+                raise unique_violation(index=index, key=new_key)
+            changes.append((values, old_key, new_key))
+
+        for values, old_key, new_key in changes:
+            if old_key is not None:
+                values.pop(old_key, None)
+            if new_key is not None:
+                values[new_key] = document_id
+
+def unique_violation(index: Index, key: tuple) -> UniqueKeyError:
+    return UniqueKeyError(key=index.fields[0][0], value=key[0])
+
+def get_index_key(document: dict, index: Index) -> tuple:
+    values = []
+    for field, _ in index.fields:
+        value = get_path(document, field)
+        values.append(None if value is MISSING else freeze(value))
+    return tuple(values)
+
+def freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return tuple((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+# Copies documents the way they would come back from MongoDB, datetimes only keep milliseconds
+def copy_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: copy_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [copy_value(item) for item in value]
+    if isinstance(value, datetime):
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
+# region paths
+def get_path(document: Any, path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+def set_path(document: dict, path: str, value: Any) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        child = document.get(part, None)
+        if not isinstance(child, dict):
+            child = {}
+            document[part] = child
+        document = child
+    document[parts[-1]] = value
+
+def unset_path(document: dict, path: str) -> None:
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.get(part, None)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+# endregion
+
+# region filters
+def matches(document: dict, filter: dict) -> bool:
+    for key, condition in filter.items():
+        match key:
+            case "$and":
+                if not all(matches(document, sub_filter) for sub_filter in condition):
+                    return False
+            case "$or":
+                if not any(matches(document, sub_filter) for sub_filter in condition):
+                    return False
+            case "$nor":
+                if any(matches(document, sub_filter) for sub_filter in condition):
+                    return False
+            case _:
+                if not matches_condition(get_path(document, key), condition):
+                    return False
+    return True
+
+def matches_condition(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict) or len(condition) == 0 or not all(str(key).startswith("$") for key in condition):
+        return values_equal(value, condition)
+    for operator, argument in condition.items():
+        match operator:
+            case "$eq":
+                result = values_equal(value, argument)
+            case "$ne":
+                result = not values_equal(value, argument)
+            case "$in":
+                result = any(values_equal(value, item) for item in argument)
+            case "$nin":
+                result = not any(values_equal(value, item) for item in argument)
+            case "$gt":
+                result = compare(value, argument) in (1,)
+            case "$gte":
+                result = compare(value, argument) in (0, 1)
+            case "$lt":
+                result = compare(value, argument) in (-1,)
+            case "$lte":
+                result = compare(value, argument) in (-1, 0)
+            case "$exists":
+                result = (value is not MISSING) == bool(argument)
+            case _:
+                raise RuntimeError(f"MemoryBackend doesn't support the query operator '{operator}'.")
+        if not result:
+            return False
+    return True
+
+def values_equal(value: Any, expected: Any) -> bool:
+    if value is MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return any(values_equal(item, expected) for item in value)
+    if isinstance(value, bool) != isinstance(expected, bool):
+        return False
+    return value == expected
+
+# Compares two values of the same BSON type bracket, None if they aren't comparable
+def compare(value: Any, other: Any) -> Optional[int]:
+    if value is MISSING:
+        return None
+    value_key, other_key = sort_key(value), sort_key(other)
+    if value_key[0] != other_key[0]:
+        return None
+    if value_key[1] == other_key[1]:
+        return 0
+    return 1 if value_key[1] > other_key[1] else -1
+
+# Orders values like MongoDB does across types: null, numbers, strings, objects, arrays, ids, booleans, dates
+def sort_key(value: Any) -> tuple[int, Any]:
+    if value is MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (6, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, dict):
+        return (3, str(value))
+    if isinstance(value, list):
+        return (4, str(value))
+    if isinstance(value, ObjectId):
+        return (5, value)
+    if isinstance(value, datetime):
+        return (7, value)
+    return (8, str(value))
+# endregion
+
+def project(document: dict, projection: Optional[dict]) -> dict:
+    if projection is None:
+        return copy_value(document)
+    result = {"_id": document["_id"]}
+    for field, include in projection.items():
+        if not include:
+            continue
+        value = get_path(document, field)
+        if value is not MISSING:
+            set_path(result, field, copy_value(value))
+    return result
+
+def apply_update(document: dict, update: dict) -> dict:
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            current = get_path(document, path)
+            match operator:
+                case "$set":
+                    set_path(document, path, copy_value(value))
+                case "$unset":
+                    unset_path(document, path)
+                case "$inc":
+                    set_path(document, path, (0 if current is MISSING else current) + value)
+                case "$max":
+                    if current is MISSING or compare(value, current) == 1:
+                        set_path(document, path, copy_value(value))
+                case "$min":
+                    if current is MISSING or compare(value, current) == -1:
+                        set_path(document, path, copy_value(value))
+                case _:
+                    raise RuntimeError(f"MemoryBackend doesn't support the update operator '{operator}'.")
+    return document
@@ -0,0 +1,134 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import Any, AsyncIterator, Optional
+from src.database.backends.storage_backend import StorageBackend
+from src.database.errors import UniqueKeyError
+from src.database.index import Index
+from src.entities.config import Config
+
+DB = "LemonTCG"
+
+class MotorBackend(StorageBackend):
+    def __init__(self) -> None:
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db = None
+
+    def connect(self, config: Config) -> None:
+        if self.client is not None:
+            return
+        options: dict[str, Any] = {
+            "maxPoolSize": config.db_max_pool_size,
+            "minPoolSize": config.db_min_pool_size,
+            "connectTimeoutMS": config.db_connect_timeout_ms,
+            "serverSelectionTimeoutMS": config.db_server_selection_timeout_ms
+        }
+        if config.db_max_idle_time_ms is not None:
+            options["maxIdleTimeMS"] = config.db_max_idle_time_ms
+        if len(config.db_compressors) > 0:
+            options["compressors"] = ",".join(config.db_compressors)
+        self.client = AsyncIOMotorClient(config.db_url, **options)
+        self.db = self.client[DB]
+
+    # Open the given amount of pooled connections up front by running concurrent pings
+    async def warm_up(self, connections: int) -> None:
+        await asyncio.gather(*(self.client.admin.command("ping") for _ in range(max(connections, 1))))
+
+    def close(self) -> None:
+        if self.client is None:
+            return
+        self.client.close()
+        self.client = None
+        self.db = None
+
+    async def create_indexes(self, collection: str, indexes: list[Index]) -> None:
+        existing = await self.db[collection].index_information()
+        models = []
+        for index in indexes:
+            # Creating an index again with other options fails, the expiry can be changed in place, other options need a new index
+            current = existing.get(index.get_name(), None)
+            if current is not None:
+                expire_after_seconds = current.get("expireAfterSeconds", None)
+                if current.get("unique", False) != index.unique or (expire_after_seconds is None) != (index.expire_after_seconds is None):
+                    await self.db[collection].drop_index(index.get_name())
+                elif expire_after_seconds != index.expire_after_seconds:
+                    await self.db.command({"collMod": collection, "index": {"name": index.get_name(), "expireAfterSeconds": index.expire_after_seconds}})
+            options: dict[str, Any] = {"name": index.get_name(), "unique": index.unique}
+            if index.expire_after_seconds is not None:
+                options["expireAfterSeconds"] = index.expire_after_seconds
+            models.append(IndexModel(index.fields, **options))
+        await self.db[collection].create_indexes(models)
+
+    async def find_one(self, collection: str, filter: dict, projection: Optional[dict] = None) -> Optional[dict]:
+        return await self.db[collection].find_one(filter=filter, projection=projection)
+
+    async def find(
+            self,
+            collection: str,
+            filter: dict,
+            projection: Optional[dict] = None,
+            sort: Optional[list[tuple[str, int]]] = None,
+            limit: int = 0,
+            batch_size: int = 100
+        ) -> AsyncIterator[dict]:
+        cursor = self.db[collection].find(filter=filter, projection=projection, limit=limit, batch_size=batch_size)
+        if isinstance(sort, list) and len(sort) > 0:
+            cursor = cursor.sort(sort)
+        async for document in cursor:
+            yield document
+
+    async def count(self, collection: str, filter: dict, limit: int = 0) -> int:
+        options = {"limit": limit} if limit > 0 else {}
+        return await self.db[collection].count_documents(filter, **options)
+
+    async def insert_one(self, collection: str, document: dict) -> str:
+        try:
+            result = await self.db[collection].insert_one(document)
+        except DuplicateKeyError as e:
+            raise unique_key_error(e)
+        return str(result.inserted_id)
+
+    async def insert_many(self, collection: str, documents: list[dict]) -> list[str]:
+        try:
+            result = await self.db[collection].insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            raise bulk_unique_key_error(e) or e
+        return [str(document_id) for document_id in result.inserted_ids]
+
+    async def update_one(self, collection: str, filter: dict, update: dict) -> None:
+        try:
+            await self.db[collection].update_one(filter, update)
+        except DuplicateKeyError as e:
+            raise unique_key_error(e)
+
+    async def update_many(self, collection: str, filter: dict, update: dict) -> int:
+        try:
+            result = await self.db[collection].update_many(filter, update)
+        except DuplicateKeyError as e:
+            raise unique_key_error(e)
+        return result.matched_count
+
+    async def bulk_update(self, collection: str, operations: list[tuple[dict, dict]]) -> None:
+        requests = [UpdateOne(filter, update) for filter, update in operations]
+        await self.db[collection].bulk_write(requests, ordered=False)
+
+    async def delete_one(self, collection: str, filter: dict) -> None:
+        await self.db[collection].delete_one(filter)
+
+    async def delete_many(self, collection: str, filter: dict) -> int:
+        result = await self.db[collection].delete_many(filter)
+        return result.deleted_count
+
+def unique_key_error(error: DuplicateKeyError) -> UniqueKeyError:
+    details = error.details if isinstance(error.details, dict) else {}
+    key_value = details.get("keyValue") or {"unknown": None}
+    key, value = next(iter(key_value.items()))
+    return UniqueKeyError(key=key, value=value)
+
+def bulk_unique_key_error(error: BulkWriteError) -> Optional[UniqueKeyError]:
+    for write_error in error.details.get("writeErrors", []):
+        if write_error.get("code", None) == 11000:
+            key, value = next(iter((write_error.get("keyValue", None) or {"unknown": None}).items()))
+            return UniqueKeyError(key=key, value=value)
+    return None
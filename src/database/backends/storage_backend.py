@@ -0,0 +1,62 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+from src.database.index import Index
+from src.entities.config import Config
+
+# The storage engine behind Database. Documents use MongoDB's shape and query language,
+# filters and updates are plain MongoDB documents and ids are ObjectIds stored as _id.
+# Violations of unique indexes raise UniqueKeyError.
+class StorageBackend(ABC):
+    @abstractmethod
+    def connect(self, config: Config) -> None: ...
+
+    @abstractmethod
+    async def warm_up(self, connections: int) -> None: ...
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+    @abstractmethod
+    async def create_indexes(self, collection: str, indexes: list[Index]) -> None: ...
+
+    @abstractmethod
+    async def find_one(self, collection: str, filter: dict, projection: Optional[dict] = None) -> Optional[dict]: ...
+
+    @abstractmethod
+    def find(
+            self,
+            collection: str,
+            filter: dict,
+            projection: Optional[dict] = None,
+            sort: Optional[list[tuple[str, int]]] = None,
+            limit: int = 0,
+            batch_size: int = 100
+        ) -> AsyncIterator[dict]: ...
+
+    # Count matching documents, stopping at the limit if it is greater than 0
+    @abstractmethod
+    async def count(self, collection: str, filter: dict, limit: int = 0) -> int: ...
+
+    @abstractmethod
+    async def insert_one(self, collection: str, document: dict) -> str: ...
+
+    # Insert all documents, those without _id get a new one, returns the ids in order
+    @abstractmethod
+    async def insert_many(self, collection: str, documents: list[dict]) -> list[str]: ...
+
+    @abstractmethod
+    async def update_one(self, collection: str, filter: dict, update: dict) -> None: ...
+
+    # Apply the update to all matching documents and return how many matched
+    @abstractmethod
+    async def update_many(self, collection: str, filter: dict, update: dict) -> int: ...
+
+    @abstractmethod
+    async def bulk_update(self, collection: str, operations: list[tuple[dict, dict]]) -> None: ...
+
+    @abstractmethod
+    async def delete_one(self, collection: str, filter: dict) -> None: ...
+
+    # Delete all matching documents and return how many were deleted
+    @abstractmethod
+    async def delete_many(self, collection: str, filter: dict) -> int: ...
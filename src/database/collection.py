@@ -4,4 +4,6 @@ class Collection(Enum):
     NONE = None
     USERS = "users"
     ROOMS = "rooms"
-    MESSAGES = "messages"
\ No newline at end of file
+    MESSAGES = "messages"
+    PRESENCE = "presence"
+    DELIVERIES = "deliveries"
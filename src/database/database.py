@@ -1,20 +1,20 @@
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional
+from typing import Any, AsyncIterator, Optional
+from src.database.backends.memory_backend import MemoryBackend
+from src.database.backends.motor_backend import MotorBackend
+from src.database.backends.storage_backend import StorageBackend
 from src.database.collection import Collection
+from src.database.errors import UniqueKeyError
+from src.database.index import Index
 from src.entities.config import Config
 
-DB = "LemonTCG"
-
 class Database():
     _instance = None
 
     def __init__(self) -> None:
         if Database._instance is not None:
             raise RuntimeError("Tried to initialize multiple instances of Database.")
-        config = Config.load_state()
-        self.client = AsyncIOMotorClient(config.db_url)
-        self.db = self.client[DB]
+        self.backend: Optional[StorageBackend] = None
 
     @staticmethod
     def get_instance() -> 'Database':
@@ -22,42 +22,153 @@ class Database():
             Database._instance = Database()
         return Database._instance
     
-    async def find_one(self, collection: Collection, **kwargs) -> Optional[dict]:
+    # The backend is usually connected by the application lifespan, scripts connect on first use
+    def get_backend(self) -> StorageBackend:
+        if self.backend is None:
+            self.connect()
+        return self.backend
+    
+    def connect(self, config: Optional[Config] = None) -> None:
+        if self.backend is not None:
+            return
+        if not isinstance(config, Config):
+            config = Config.load_state()
+        backend = create_backend(name=config.db_backend)
+        backend.connect(config=config)
+        self.backend = backend
+
+    # Replace the current backend, e.g. with a MemoryBackend for tests and benchmarks
+    def use_backend(self, backend: StorageBackend) -> None:
+        self.close()
+        self.backend = backend
+
+    async def warm_up(self, connections: int) -> None:
+        await self.get_backend().warm_up(connections=connections)
+
+    def close(self) -> None:
+        if self.backend is None:
+            return
+        self.backend.close()
+        self.backend = None
+    
+    async def create_indexes(self, collection: Collection, indexes: list[Index]) -> None:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method create_indexes received an invalid collection")
+        await self.get_backend().create_indexes(collection=collection.value, indexes=indexes)
+    
+    async def find_one(self, collection: Collection, projection: Optional[list[str]] = None, **kwargs) -> Optional[dict]:
         if not isinstance(collection, Collection) or collection == Collection.NONE:
             raise RuntimeError(f"Database method find_one received an invalid collection")
-        response = await self.db[collection.value].find_one(filter=kwargs)
+        response = await self.get_backend().find_one(collection=collection.value, filter=kwargs, projection=build_projection(projection))
         if isinstance(response, dict):
             response["id"] = str(response.pop("_id"))
         return response
     
-    async def find_all(self, collection: Collection, **kwargs) -> list[dict]:
+    # Stream matching documents in batches instead of loading all of them into memory
+    async def find(
+            self,
+            collection: Collection,
+            filter: dict,
+            projection: Optional[list[str]] = None,
+            sort: Optional[list[tuple[str, int]]] = None,
+            limit: int = 0,
+            batch_size: int = 100
+        ) -> AsyncIterator[dict]:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method find received an invalid collection")
+        documents = self.get_backend().find(collection=collection.value, filter=filter, projection=build_projection(projection), sort=sort, limit=limit, batch_size=batch_size)
+        async for document in documents:
+            document["id"] = str(document.pop("_id"))
+            yield document
+    
+    # Fetch all documents whose field matches one of the values in a single query, keyed by that field
+    async def find_many(self, collection: Collection, field: str, values: list[Any], projection: Optional[list[str]] = None) -> dict[Any, dict]:
         if not isinstance(collection, Collection) or collection == Collection.NONE:
-            raise RuntimeError(f"Database method find_all received an invalid collection")
-        cursor = self.db[collection.value].find(filter=kwargs)
-        results = []
-        async for document in cursor:
-            if isinstance(document, dict):
-                document['id'] = str(document.pop("_id"))
-            results.append(document)
+            raise RuntimeError(f"Database method find_many received an invalid collection")
+        if len(values) == 0:
+            return {}
+        if isinstance(projection, list) and field not in projection:
+            projection = projection + [field]
+        documents = self.get_backend().find(collection=collection.value, filter={field: {"$in": list(set(values))}}, projection=build_projection(projection))
+        results = {}
+        async for document in documents:
+            document["id"] = str(document.pop("_id"))
+            results[document[field]] = document
         return results
     
-    async def save(self, collection: Collection, document: dict, unique_keys: list[str] = []) -> None:
-        if not isinstance(collection, Collection) or collection == Collection.NONE:
-            raise RuntimeError(f"Database method save received an invalid collection")
-        id = document.pop("id")
-        if isinstance(id, str):
-            # Update entry
-            await self.db[collection.value].replace_one({"_id": ObjectId(id)}, document)
-        else:
-            # Insert new entry & check for unique keys
-            for key in unique_keys:
-                value = document.get(key, None)
-                result = await self.find_one(collection=collection, **{key: value})
-                if isinstance(result, dict):
-                    raise RuntimeError(f"Key '{key}' is a unique key, but entry with value '{value}' already exists.")
-            await self.db[collection.value].insert_one(document)
+    # Count matching documents, counting stops at the limit if it is greater than 0
+    async def count(self, collection: Collection, limit: int = 0, **kwargs) -> int:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method count received an invalid collection")
+        return await self.get_backend().count(collection=collection.value, filter=kwargs, limit=limit)
+    
+    async def exists(self, collection: Collection, **kwargs) -> bool:
+        return await self.count(collection, limit=1, **kwargs) > 0
+    
+    # Insert a new entry and return its id, uniqueness is enforced by the unique indexes
+    async def insert(self, collection: Collection, document: dict) -> str:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method insert received an invalid collection")
+        document.pop("id", None)
+        return await self.get_backend().insert_one(collection=collection.value, document=document)
+    
+    # Insert many documents with a single write, documents may bring their own id
+    async def insert_many(self, collection: Collection, documents: list[dict]) -> list[str]:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method insert_many received an invalid collection")
+        if len(documents) == 0:
+            return []
+        for document in documents:
+            document_id = document.pop("id", None)
+            if isinstance(document_id, str):
+                document["_id"] = ObjectId(document_id)
+        return await self.get_backend().insert_many(collection=collection.value, documents=documents)
+    
+    # Apply an update document ($set, $unset, $inc, ...) to an existing entry
+    async def update(self, collection: Collection, document_id: str, update: dict) -> None:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method update received an invalid collection")
+        if len(update) == 0:
+            return
+        await self.get_backend().update_one(collection=collection.value, filter={"_id": ObjectId(document_id)}, update=update)
+
+    # Apply an update document to every matching entry, returns how many matched
+    async def update_many(self, collection: Collection, update: dict, **kwargs) -> int:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method update_many received an invalid collection")
+        if len(update) == 0:
+            return 0
+        return await self.get_backend().update_many(collection=collection.value, filter=kwargs, update=update)
+
+    # Apply many (filter, update) pairs with a single unordered bulk write
+    async def bulk_update(self, collection: Collection, operations: list[tuple[dict, dict]]) -> None:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method bulk_update received an invalid collection")
+        if len(operations) == 0:
+            return
+        await self.get_backend().bulk_update(collection=collection.value, operations=operations)
 
     async def delete(self, collection: Collection, document_id: str) -> None:
         if not isinstance(collection, Collection) or collection == Collection.NONE:
             raise RuntimeError(f"Database method delete received an invalid collection")
-        await self.db[collection.value].delete_one({"_id": ObjectId(document_id)})
\ No newline at end of file
+        await self.get_backend().delete_one(collection=collection.value, filter={"_id": ObjectId(document_id)})
+
+    async def delete_many(self, collection: Collection, **kwargs) -> int:
+        if not isinstance(collection, Collection) or collection == Collection.NONE:
+            raise RuntimeError(f"Database method delete_many received an invalid collection")
+        return await self.get_backend().delete_many(collection=collection.value, filter=kwargs)
+
+def create_backend(name: str) -> StorageBackend:
+    match name:
+        case "motor":
+            return MotorBackend()
+        case "memory":
+            return MemoryBackend()
+        case _:
+            raise RuntimeError(f"Unknown database backend '{name}'.")
+
+# Only the given fields (and _id) are returned, None returns the whole document
+def build_projection(fields: Optional[list[str]]) -> Optional[dict[str, int]]:
+    if fields is None:
+        return None
+    return {field: 1 for field in fields}
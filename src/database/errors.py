@@ -0,0 +1,7 @@
+from typing import Any
+
+class UniqueKeyError(RuntimeError):
+    def __init__(self, key: str, value: Any) -> None:
+        super().__init__(f"Key '{key}' is a unique key, but entry with value '{value}' already exists.")
+        self.key = key
+        self.value = value
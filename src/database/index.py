@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Optional
+
+ASCENDING = 1
+DESCENDING = -1
+
+class Index(BaseModel):
+    fields: list[tuple[str, int]]
+    unique: bool = False
+    expire_after_seconds: Optional[int] = None
+
+    def get_name(self) -> str:
+        return "_".join(f"{field}_{direction}" for field, direction in self.fields)
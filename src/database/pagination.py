@@ -0,0 +1,39 @@
+import base64
+from bson import ObjectId, json_util
+from typing import Any, Optional
+from src.database.index import ASCENDING
+
+# Cursors are opaque tokens holding the sort value and id of the last entry of a page
+
+def encode_cursor(value: Any, document_id: str) -> str:
+    data = json_util.dumps({"v": value, "id": ObjectId(document_id)})
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[Any, ObjectId]:
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        data = json_util.loads(base64.urlsafe_b64decode(cursor + padding).decode("utf-8"))
+        document_id = data["id"]
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    if not isinstance(document_id, ObjectId):
+        raise ValueError("Invalid cursor.")
+    return data.get("v", None), document_id
+
+# Filter matching every entry after the cursor for the given sort order, the id breaks ties
+def keyset_filter(sort_field: str, direction: int, cursor: Optional[str]) -> dict:
+    if not isinstance(cursor, str):
+        return {}
+    value, document_id = decode_cursor(cursor)
+    operator = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field == "_id":
+        return {"_id": {operator: document_id}}
+    return {"$or": [
+        {sort_field: {operator: value}},
+        {sort_field: value, "_id": {operator: document_id}}
+    ]}
+
+def keyset_sort(sort_field: str, direction: int) -> list[tuple[str, int]]:
+    if sort_field == "_id":
+        return [("_id", direction)]
+    return [(sort_field, direction), ("_id", direction)]
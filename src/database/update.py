@@ -0,0 +1,41 @@
+from typing import Any
+
+# Builds a minimal MongoDB update document which turns the old document into the new one.
+# Nested dictionaries are diffed per key, integer changes of counter fields become $inc.
+def build_update(old: dict, new: dict, counter_fields: list[str] = []) -> dict:
+    update: dict[str, dict[str, Any]] = {"$set": {}, "$unset": {}, "$inc": {}}
+    diff_documents(old=old, new=new, prefix="", counter_fields=counter_fields, update=update)
+    return {operator: fields for operator, fields in update.items() if len(fields) > 0}
+
+def diff_documents(old: dict, new: dict, prefix: str, counter_fields: list[str], update: dict) -> None:
+    for key, value in new.items():
+        path = prefix + key
+        is_counter_field = path.split(".")[0] in counter_fields
+        if key not in old:
+            if is_counter(value) and is_counter_field:
+                update["$inc"][path] = value
+            else:
+                update["$set"][path] = value
+            continue
+
+        previous = old[key]
+        if type(previous) is type(value) and previous == value:
+            continue
+
+        if isinstance(previous, dict) and isinstance(value, dict) and has_safe_keys(previous) and has_safe_keys(value):
+            diff_documents(old=previous, new=value, prefix=path + ".", counter_fields=counter_fields, update=update)
+        elif is_counter(previous) and is_counter(value) and is_counter_field:
+            update["$inc"][path] = value - previous
+        else:
+            update["$set"][path] = value
+
+    for key in old:
+        if key not in new:
+            update["$unset"][prefix + key] = ""
+
+# Keys containing dots or starting with $ can't be addressed with a field path
+def has_safe_keys(document: dict) -> bool:
+    return all(isinstance(key, str) and len(key) > 0 and "." not in key and not key.startswith("$") for key in document)
+
+def is_counter(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
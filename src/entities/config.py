@@ -1,6 +1,67 @@
 from lemon_tcg.entities.base_save_state_entity import BaseSaveStateEntity
+from typing import Optional
 from src.utils.file_operations import construct_path
 
 class Config(BaseSaveStateEntity):
     FILE_PATH = construct_path("src/config.json")
-    db_url: str = ""
\ No newline at end of file
+    # The storage backend, "motor" for MongoDB or "memory" for the in-process engine
+    db_backend: str = "motor"
+    db_url: str = ""
+    # Connection pool settings of the database client
+    db_max_pool_size: int = 100
+    db_min_pool_size: int = 10
+    db_max_idle_time_ms: Optional[int] = None
+    db_connect_timeout_ms: int = 10000
+    db_server_selection_timeout_ms: int = 10000
+    # Wire compression in order of preference, e.g. ["zstd", "snappy", "zlib"]
+    db_compressors: list[str] = []
+    # Seconds between writing the aggregated endpoint usage of all users
+    usage_flush_interval: float = 10.0
+    # Authenticated users are cached by api key, entries expire after the ttl in seconds.
+    # Only writes of the same process invalidate entries, with multiple workers changes of other workers show up after the ttl.
+    auth_cache_size: int = 10000
+    auth_cache_ttl: float = 60.0
+    # Unknown api keys are remembered for the ttl in seconds and rejected without a database query
+    auth_negative_cache_size: int = 100000
+    auth_negative_cache_ttl: float = 300.0
+    # Rooms without activity for room_idle_timeout seconds or without opponent for room_unfilled_timeout seconds are deleted
+    room_idle_timeout: int = 3600
+    room_unfilled_timeout: int = 900
+    room_sweep_interval: float = 60.0
+    # Pages of the public room list are shared between all clients for the ttl in seconds
+    room_list_cache_size: int = 1000
+    room_list_cache_ttl: float = 1.0
+    # Players are only paired within the same or a neighbouring rating bucket of this width
+    matchmaking_bucket_width: int = 100
+    # Players are dropped from the queue after waiting for the timeout in seconds
+    matchmaking_queue_timeout: float = 120.0
+    # Matches are kept for the ttl in seconds until the players picked them up
+    matchmaking_result_cache_size: int = 100000
+    matchmaking_result_ttl: float = 300.0
+    # Active rooms are kept in memory, changes are written every flush interval and rooms unused for the idle timeout are dropped.
+    # With the "database" backplane rooms are read from and written to the database on every request instead.
+    room_store_flush_interval: float = 1.0
+    room_store_idle_timeout: float = 300.0
+    # Receivers of private messages are cached by name, entries expire after the ttl in seconds
+    pm_receiver_cache_size: int = 10000
+    pm_receiver_cache_ttl: float = 300.0
+    # Routes private messages between server processes, "local" for a single process or "database" for multiple workers.
+    # Running several workers with "local" breaks private messages between them and the rooms kept in memory.
+    pm_backplane: str = "local"
+    pm_backplane_poll_interval: float = 0.05
+    # Private messages are stored in batches of up to pm_write_batch_size, collected for at most pm_write_interval seconds.
+    # With pm_durable_ack the sender is only told the message was delivered once it is stored.
+    # Failed batches are retried, waiting from pm_write_retry_delay up to pm_write_max_retry_delay seconds in between.
+    pm_write_queue_size: int = 10000
+    pm_write_batch_size: int = 500
+    pm_write_interval: float = 0.01
+    pm_durable_ack: bool = False
+    pm_write_retry_delay: float = 0.1
+    pm_write_max_retry_delay: float = 5.0
+    # Every private message connection queues up to pm_send_queue_size outgoing messages, see PmSession for the overflow policies
+    pm_send_queue_size: int = 256
+    pm_send_timeout: float = 10.0
+    pm_overflow_policy: str = "spill"
+    # Dead private message connections are detected by the websocket pings of uvicorn, see start.sh.
+    # Connections closed after a failed send are removed every pm_reap_interval seconds.
+    pm_reap_interval: float = 10.0
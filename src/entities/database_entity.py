@@ -1,35 +1,251 @@
-from pydantic import BaseModel
-from typing import ClassVar, Optional
+from bson import ObjectId
+from pydantic import BaseModel, PrivateAttr
+from typing import AsyncIterator, Callable, ClassVar, Optional, TypeVar
 from src.database.collection import Collection
 from src.database.database import Database
+from src.database.index import Index, ASCENDING
+from src.database.pagination import encode_cursor, keyset_filter, keyset_sort
+from src.database.update import build_update
+from src.entities.config import Config
+from src.entities.unit_of_work import get_unit_of_work
 
 DB = Database.get_instance()
 
+View = TypeVar("View", bound=BaseModel)
+
+SCHEMA_FIELD = "_schema"
+
+# Every DatabaseEntity subclass registers itself here to have its indexes created on startup
+ENTITY_CLASSES: list[type['DatabaseEntity']] = []
+
+# Callbacks per entity class which are notified whenever an entity of that class is written or deleted
+WRITE_LISTENERS: dict[type['DatabaseEntity'], list[Callable[['DatabaseEntity'], None]]] = {}
+
 class DatabaseEntity(BaseModel):
     COLLECTION: ClassVar[Collection] = Collection.NONE
-    UNIQUE_FIELDS: ClassVar[list[str]] = []
+    INDEXES: ClassVar[list[Index]] = []
+    # Integer fields (or dictionaries of integers) which are updated with $inc instead of $set
+    COUNTER_FIELDS: ClassVar[list[str]] = []
+    # Bump the schema version whenever the stored form of the fields changes
+    SCHEMA_VERSION: ClassVar[int] = 1
+    TRUSTED_HYDRATION: ClassVar[bool] = False
     id: Optional[str] = None
+    # The document as it was last loaded from or written to the database
+    _snapshot: Optional[dict] = PrivateAttr(default=None)
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        ENTITY_CLASSES.append(cls)
+
+    # Entities with indexes depending on the configuration override this
+    @classmethod
+    def get_indexes(cls, config: Config) -> list[Index]:
+        return cls.INDEXES
+
+    @staticmethod
+    async def create_indexes(config: Optional[Config] = None) -> None:
+        config = config if config is not None else Config.load_state()
+        for entity_class in ENTITY_CLASSES:
+            indexes = entity_class.get_indexes(config)
+            if entity_class.COLLECTION == Collection.NONE or len(indexes) == 0:
+                continue
+            await DB.create_indexes(collection=entity_class.COLLECTION, indexes=indexes)
+
+    @classmethod
+    def on_write(cls, listener: Callable[['DatabaseEntity'], None]) -> None:
+        WRITE_LISTENERS.setdefault(cls, []).append(listener)
+
+    def notify_write(self) -> None:
+        for listener in WRITE_LISTENERS.get(type(self), []):
+            listener(self)
+
+    @classmethod
+    def get_unique_fields(cls) -> list[str]:
+        return [index.fields[0][0] for index in cls.INDEXES if index.unique and len(index.fields) == 1]
+
+    # Documents of the current schema version were written by this server and are already in their dumped form,
+    # so with trusted hydration they are used as the change tracking snapshot instead of dumping the entity again
+    @classmethod
+    def from_document(cls, document: dict):
+        entity = cls.model_validate(document)
+        is_current = document.get(SCHEMA_FIELD, None) == cls.SCHEMA_VERSION
+        if cls.TRUSTED_HYDRATION and is_current:
+            snapshot = {name: document[name] for name in cls.model_fields if name in document and name != "id"}
+            snapshot[SCHEMA_FIELD] = cls.SCHEMA_VERSION
+            entity._snapshot = snapshot
+            return entity
+        entity.mark_clean()
+        if not is_current:
+            # Outdated documents get the current schema version with their next save
+            entity._snapshot.pop(SCHEMA_FIELD, None)
+        return entity
+    
+    # Inside a unit of work, entities which were already loaded during the request are reused
+    @classmethod
+    def load(cls, document: dict):
+        unit_of_work = get_unit_of_work()
+        if unit_of_work is None:
+            return cls.from_document(document)
+        entity = unit_of_work.entities.get((cls, document["id"]), None)
+        if entity is None:
+            entity = unit_of_work.register(cls.from_document(document))
+        return entity
 
     @classmethod
     async def find_one(cls, **kwargs):
+        unit_of_work = get_unit_of_work()
+        if unit_of_work is not None:
+            entity = unit_of_work.lookup(entity_class=cls, filter=kwargs)
+            if entity is not None:
+                return entity
         result = await DB.find_one(collection=cls.COLLECTION, **kwargs)
         if isinstance(result, dict):
-            return cls.model_validate(result)
+            return cls.load(result)
         
     @classmethod
     async def find_all(cls, **kwargs):
-        result = await DB.find_all(collection=cls.COLLECTION, **kwargs)
-        entities = []
-        for data in result:
-            entity = cls.model_validate(data)
-            entities.append(entity)
-        return entities
+        return [entity async for entity in cls.stream(**kwargs)]
     
+    # Lazily iterate over matching entities, keeping only one batch in memory
+    @classmethod
+    async def stream(
+            cls,
+            batch_size: int = 100,
+            limit: int = 0,
+            sort: Optional[list[tuple[str, int]]] = None,
+            **kwargs
+        ) -> AsyncIterator:
+        async for document in DB.find(collection=cls.COLLECTION, filter=kwargs, sort=sort, limit=limit, batch_size=batch_size):
+            yield cls.load(document)
+
+    # Load one page of entities sorted by the given field, the returned cursor points to the next page
+    @classmethod
+    async def find_page(
+            cls,
+            limit: int,
+            sort_field: str = "_id",
+            direction: int = ASCENDING,
+            cursor: Optional[str] = None,
+            **kwargs
+        ) -> tuple[list, Optional[str]]:
+        filter = {"$and": [kwargs, keyset_filter(sort_field=sort_field, direction=direction, cursor=cursor)]}
+        documents = DB.find(collection=cls.COLLECTION, filter=filter, sort=keyset_sort(sort_field=sort_field, direction=direction), limit=limit + 1, batch_size=limit + 1)
+        entities = [cls.load(document) async for document in documents]
+        if len(entities) <= limit:
+            return entities, None
+        entities = entities[:limit]
+        last = entities[-1]
+        value = last.id if sort_field == "_id" else getattr(last, sort_field)
+        return entities, encode_cursor(value=value, document_id=str(last.id))
+
+    # Load only the fields of the given view model instead of the whole entity
+    @classmethod
+    async def find_one_as(cls, view: type[View], **kwargs) -> Optional[View]:
+        result = await DB.find_one(collection=cls.COLLECTION, projection=get_view_fields(view), **kwargs)
+        if isinstance(result, dict):
+            return view.model_validate(result)
+
+    @classmethod
+    async def find_all_as(cls, view: type[View], **kwargs) -> list[View]:
+        documents = DB.find(collection=cls.COLLECTION, filter=kwargs, projection=get_view_fields(view))
+        return [view.model_validate(document) async for document in documents]
+
+    @classmethod
+    async def find_many(cls, field: str, values: list) -> dict:
+        result = await DB.find_many(collection=cls.COLLECTION, field=field, values=values)
+        return {value: cls.load(data) for value, data in result.items()}
+
+    @classmethod
+    async def find_many_as(cls, view: type[View], field: str, values: list) -> dict:
+        result = await DB.find_many(collection=cls.COLLECTION, field=field, values=values, projection=get_view_fields(view))
+        return {value: view.model_validate(data) for value, data in result.items()}
+    
+    @classmethod
+    async def count(cls, limit: int = 0, **kwargs) -> int:
+        return await DB.count(collection=cls.COLLECTION, limit=limit, **kwargs)
+    
+    @classmethod
+    async def exists(cls, **kwargs) -> bool:
+        return await DB.exists(collection=cls.COLLECTION, **kwargs)
+    
+    def get_document(self) -> dict:
+        document = self.model_dump(exclude={"id"})
+        document[SCHEMA_FIELD] = self.SCHEMA_VERSION
+        return document
+
+    def mark_clean(self, document: Optional[dict] = None) -> None:
+        self._snapshot = document if document is not None else self.get_document()
+
+    # The update document containing only the fields that changed since the entity was loaded
+    def get_changes(self, document: Optional[dict] = None) -> dict:
+        if document is None:
+            document = self.get_document()
+        if self._snapshot is None:
+            return {"$set": document}
+        return build_update(old=self._snapshot, new=document, counter_fields=self.COUNTER_FIELDS)
+    
+    def is_dirty(self) -> bool:
+        return len(self.get_changes()) > 0
+    
+    # Inside a unit of work updates are deferred until the end of the request, inserts are written immediately
     async def save(self) -> None:
-        document = self.model_dump()
-        await DB.save(collection=self.COLLECTION, document=document, unique_keys=self.UNIQUE_FIELDS)
+        unit_of_work = get_unit_of_work()
+        if unit_of_work is not None and isinstance(self.id, str):
+            unit_of_work.add_pending(self)
+            return
+        await self.write()
+        if unit_of_work is not None:
+            unit_of_work.register(self)
+
+    async def write(self) -> None:
+        if not isinstance(self.id, str):
+            self.id = await DB.insert(collection=self.COLLECTION, document=self.get_document())
+        else:
+            await DB.update(collection=self.COLLECTION, document_id=self.id, update=self.get_changes())
+        self.mark_clean()
+        self.notify_write()
+
+    # Write the changes of multiple loaded entities of this class with a single bulk write
+    @classmethod
+    async def write_many(cls, entities: list['DatabaseEntity']) -> None:
+        operations = []
+        # Changes made while the bulk write is running stay dirty, the snapshots are taken before writing
+        documents = []
+        for entity in entities:
+            document = entity.get_document()
+            changes = entity.get_changes(document=document)
+            if len(changes) > 0:
+                operations.append(({"_id": ObjectId(entity.id)}, changes))
+            documents.append(document)
+        await DB.bulk_update(collection=cls.COLLECTION, operations=operations)
+        for entity, document in zip(entities, documents):
+            entity.mark_clean(document=document)
+            entity.notify_write()
+
+    # Insert multiple new entities of this class with a single write, ids which are already set are kept
+    @classmethod
+    async def insert_many(cls, entities: list['DatabaseEntity']) -> None:
+        documents = [entity.get_document() for entity in entities]
+        ids = await DB.insert_many(collection=cls.COLLECTION, documents=[document | {"id": entity.id} for entity, document in zip(entities, documents)])
+        for entity, document, entity_id in zip(entities, documents, ids):
+            entity.id = entity_id
+            entity.mark_clean(document=document)
+            entity.notify_write()
 
     async def delete(self) -> None:
         if not isinstance(self.id, str):
             return
-        await DB.delete(collection=self.COLLECTION, document_id=self.id)
\ No newline at end of file
+        unit_of_work = get_unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.forget(self)
+        await DB.delete(collection=self.COLLECTION, document_id=self.id)
+        self.notify_write()
+
+    # Delete all matching entries directly in the database, loaded entities and write listeners are not involved
+    @classmethod
+    async def delete_many(cls, **kwargs) -> int:
+        return await DB.delete_many(collection=cls.COLLECTION, **kwargs)
+
+def get_view_fields(view: type[BaseModel]) -> list[str]:
+    return [field.alias or name for name, field in view.model_fields.items() if name != "id"]
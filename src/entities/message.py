@@ -1,12 +1,89 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
 from typing import Optional
 from src.database.collection import Collection
+from src.database.database import Database
+from src.database.index import Index, ASCENDING
 from src.entities.database_entity import DatabaseEntity
+from src.entities.user import User
+from src.models.pm_models import InboxMessage, InboxPage, PmSender, WsResponse
 
 class Message(DatabaseEntity):
     COLLECTION = Collection.MESSAGES
+    INDEXES = [
+        # Serves the inbox, the id is part of the index since pages are sorted by it to break ties
+        Index(fields=[("receiver_key", ASCENDING), ("read", ASCENDING), ("sent_stamp", ASCENDING), ("_id", ASCENDING)]),
+        Index(fields=[("sender_key", ASCENDING), ("receiver_key", ASCENDING), ("sent_stamp", ASCENDING)])
+    ]
+    TRUSTED_HYDRATION = True
     content: str
     sender_key: str
     receiver_key: str
     sent_stamp: int
     read: bool = False
-    read_stamp: Optional[int] = None
\ No newline at end of file
+    read_stamp: Optional[int] = None
+
+    # Mark a message as read without loading it, e.g. once another worker delivered it
+    @staticmethod
+    async def mark_read(message_id: str) -> None:
+        update = {"$set": {"read": True, "read_stamp": int(datetime.now().timestamp())}}
+        await Database.get_instance().update(collection=Collection.MESSAGES, document_id=message_id, update=update)
+
+    # Oldest unread messages of the receiver first
+    @staticmethod
+    async def get_inbox(receiver_key: str, limit: int, cursor: Optional[str] = None) -> tuple[list['Message'], dict[str, PmSender], Optional[str]]:
+        messages, next_cursor = await Message.find_page(
+            limit=limit,
+            sort_field="sent_stamp",
+            direction=ASCENDING,
+            cursor=cursor,
+            receiver_key=receiver_key,
+            read=False
+        )
+        senders = await User.find_many_as(PmSender, field="key", values=[message.sender_key for message in messages])
+        return messages, senders, next_cursor
+
+    @staticmethod
+    async def get_inbox_page(receiver_key: str, limit: int, cursor: Optional[str] = None) -> InboxPage:
+        messages, senders, next_cursor = await Message.get_inbox(receiver_key=receiver_key, limit=limit, cursor=cursor)
+        return InboxPage(messages=[message.get_inbox_message(sender=senders.get(message.sender_key, None)) for message in messages], cursor=next_cursor)
+
+    # Mark unread messages of the receiver as read with a single update, returns how many were marked
+    @staticmethod
+    async def mark_read_many(receiver_key: str, message_ids: list[str]) -> int:
+        try:
+            ids = [ObjectId(message_id) for message_id in message_ids]
+        except (InvalidId, TypeError):
+            raise ValueError("Invalid message id.")
+        update = {"$set": {"read": True, "read_stamp": int(datetime.now().timestamp())}}
+        return await Database.get_instance().update_many(collection=Collection.MESSAGES, update=update, _id={"$in": ids}, receiver_key=receiver_key, read=False)
+
+    # Put messages which were never sent back into the inbox of their receiver
+    @staticmethod
+    async def mark_unread_many(message_ids: list[str]) -> int:
+        update = {"$set": {"read": False, "read_stamp": None}}
+        return await Database.get_instance().update_many(collection=Collection.MESSAGES, update=update, _id={"$in": [ObjectId(message_id) for message_id in message_ids]})
+
+    # The ids of the given messages which are already stored
+    @staticmethod
+    async def get_stored_ids(message_ids: list[str]) -> set[str]:
+        documents = Database.get_instance().find(collection=Collection.MESSAGES, filter={"_id": {"$in": [ObjectId(message_id) for message_id in message_ids]}}, projection=["_id"])
+        return {document["id"] async for document in documents}
+
+    def get_inbox_message(self, sender: Optional[PmSender]) -> InboxMessage:
+        return InboxMessage(
+            id=self.id,
+            sender_name=sender.name if isinstance(sender, PmSender) else None,
+            sender_public_key=sender.e2ee.public if isinstance(sender, PmSender) else None,
+            content=self.content,
+            sent_stamp=self.sent_stamp
+        )
+
+    def get_ws_response(self, sender: Optional[PmSender]) -> WsResponse:
+        return WsResponse(
+            code=4,
+            message=self.content,
+            sender_name=sender.name if isinstance(sender, PmSender) else None,
+            sender_public_key=sender.e2ee.public if isinstance(sender, PmSender) else None
+        )
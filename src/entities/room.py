@@ -1,42 +1,99 @@
 import secrets
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
+from pydantic import Field
 from src.database.collection import Collection
+from src.database.errors import UniqueKeyError
+from src.database.index import Index, ASCENDING, DESCENDING
+from src.entities.config import Config
 from src.entities.database_entity import DatabaseEntity
 from src.entities.user import User
-from src.models.room_models import RoomInformation
+from src.models.room_models import RoomInformation, RoomList
+from src.models.user_models import UserPublicInformation
+from src.utils.time_operations import utc_now, utc_timestamp
 
 CODE_CHARACTERS = "ABCDEFGHKMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+MAX_CODE_ATTEMPTS = 20
 MAX_ROOM_COUNT = 5
 
 class Room(DatabaseEntity):
     COLLECTION = Collection.ROOMS
+    INDEXES = [
+        Index(fields=[("code", ASCENDING)], unique=True),
+        Index(fields=[("owner_key", ASCENDING)]),
+        # Serves the public room list, the id is part of the index since pages are sorted by it to break ties
+        Index(fields=[("visible", ASCENDING), ("opponent_key", ASCENDING), ("created_stamp", DESCENDING), ("_id", DESCENDING)])
+    ]
+    TRUSTED_HYDRATION = True
     code: str
     owner_key: str
     owner_ready: bool = False
     opponent_key: Optional[str] = None
     opponent_ready: bool = False
     visible: bool = False
-    created_stamp: datetime = datetime.now()
+    # Rooms which ever had an opponent are only removed once idle, also after the opponent left
+    filled: bool = False
+    # Stamps are in UTC, last_activity is compared by a TTL index
+    created_stamp: datetime = Field(default_factory=utc_now)
+    last_activity: datetime = Field(default_factory=utc_now)
+
+    # Lets the database drop idle rooms on its own, the sweeper additionally removes rooms which never got an opponent
+    @classmethod
+    def get_indexes(cls, config: Config) -> list[Index]:
+        return cls.INDEXES + [Index(fields=[("last_activity", ASCENDING)], expire_after_seconds=config.room_idle_timeout)]
 
     @staticmethod
     async def create(owner_key: str, visibe: bool = False) -> Optional['Room']:
-        rooms = await Room.find_all(owner_key=owner_key)
-        if len(rooms) >= MAX_ROOM_COUNT:
+        room_count = await Room.count(limit=MAX_ROOM_COUNT, owner_key=owner_key)
+        if room_count >= MAX_ROOM_COUNT:
             return
-        code = await generate_code()
-        return Room(owner_key=owner_key, code=code, visible=visibe)
+        room = Room(owner_key=owner_key, code=generate_code(), visible=visibe)
+        await room.insert_with_unique_code()
+        return room
+    
+    # Insert the room and draw a new code whenever the unique index reports the code as taken,
+    # so allocating a code needs no read and concurrent creators can't end up with the same code
+    async def insert_with_unique_code(self, code_length: int = CODE_LENGTH, max_attempts: int = MAX_CODE_ATTEMPTS) -> None:
+        for _ in range(max_attempts):
+            try:
+                await self.save()
+                return
+            except UniqueKeyError as e:
+                if e.key != "code":
+                    raise
+                self.code = generate_code(length=code_length)
+        raise RuntimeError("Unable to allocate a free room code.")
     
+    # Newest public rooms which are still waiting for an opponent
+    @staticmethod
+    async def list_open(limit: int, cursor: Optional[str] = None) -> RoomList:
+        rooms, next_cursor = await Room.find_page(
+            limit=limit,
+            sort_field="created_stamp",
+            direction=DESCENDING,
+            cursor=cursor,
+            visible=True,
+            opponent_key=None
+        )
+        owners = await User.find_many_as(UserPublicInformation, field="key", values=[room.owner_key for room in rooms])
+        return RoomList(rooms=[room.build_information(participants=owners) for room in rooms], cursor=next_cursor)
+
     async def get_information(self) -> RoomInformation:
-        owner = await User.find_one(key=self.owner_key)
-        opponent = await User.find_one(key=self.opponent_key) if self.opponent_key else None
+        participant_keys = [self.owner_key, self.opponent_key] if self.opponent_key else [self.owner_key]
+        participants = await User.find_many_as(UserPublicInformation, field="key", values=participant_keys)
+        return self.build_information(participants=participants)
+
+    def build_information(self, participants: dict[str, UserPublicInformation]) -> RoomInformation:
+        owner = participants.get(self.owner_key, None)
+        opponent = participants.get(self.opponent_key, None) if self.opponent_key else None
         return RoomInformation(
             code=self.code,
-            owner_name=owner.name if isinstance(owner, User) else "No Name",
-            opponent_name=opponent.name if isinstance(opponent, User) else None,
+            owner_name=owner.name if isinstance(owner, UserPublicInformation) else "No Name",
+            opponent_name=opponent.name if isinstance(opponent, UserPublicInformation) else None,
             owner_ready=self.owner_ready,
             opponent_ready=self.opponent_ready,
-            created_stamp=int(self.created_stamp.timestamp()),
+            created_stamp=utc_timestamp(self.created_stamp),
             is_ready=self.is_ready()
         )
     
@@ -48,17 +105,19 @@ class Room(DatabaseEntity):
         if key == self.owner_key:
             return False, "Can't join your own room."
         self.opponent_key = key
+        self.filled = True
+        self.touch()
         return True, ""
     
-    async def leave(self, key: str) -> tuple[bool, str]:
+    # The room has to be deleted by the caller once the owner left
+    def leave(self, key: str) -> tuple[bool, str]:
         match key:
             case self.owner_key:
-                await self.delete()
                 return True, "Room closed."
             case self.opponent_key:
                 self.opponent_key = None
                 self.opponent_ready = False
-                await self.save()
+                self.touch()
                 return True, "Left room."
             case _:
                 return False, "Not a participant of the room."
@@ -67,13 +126,25 @@ class Room(DatabaseEntity):
         match key:
             case self.owner_key:
                 self.owner_ready = state
+                self.touch()
                 return True, ""
             case self.opponent_key:
                 self.opponent_ready = state
+                self.touch()
                 return True, ""
             case _:
                 return False, "Not a participant of the room."
             
+    def touch(self) -> None:
+        self.last_activity = utc_now()
+
+    # Mirrors get_expired_filter for rooms held in memory
+    def is_expired(self, idle_timeout: float, unfilled_timeout: float) -> bool:
+        now = utc_now()
+        if self.last_activity < now - timedelta(seconds=idle_timeout):
+            return True
+        return not self.filled and self.opponent_key is None and self.created_stamp < now - timedelta(seconds=unfilled_timeout)
+
     def visible_to(self, key: str) -> bool:
         if self.visible:
             return True
@@ -82,9 +153,15 @@ class Room(DatabaseEntity):
     def is_ready(self) -> bool:
         return isinstance(self.opponent_key, str) and self.owner_ready and self.opponent_ready
 
-async def generate_code() -> str:
-    while True:
-        code = ''.join(secrets.choice(CODE_CHARACTERS) for _ in range(6))
-        room = await Room.find_one(code=code)
-        if not isinstance(room, Room):
-            return code
\ No newline at end of file
+def generate_code(length: int = CODE_LENGTH) -> str:
+    return ''.join(secrets.choice(CODE_CHARACTERS) for _ in range(length))
+
+# Rooms which were idle for too long or never had an opponent, rooms stored before last_activity existed fall back to their creation
+def get_expired_filter(idle_timeout: float, unfilled_timeout: float) -> dict:
+    now = utc_now()
+    idle_cutoff = now - timedelta(seconds=idle_timeout)
+    return {"$or": [
+        {"last_activity": {"$lt": idle_cutoff}},
+        {"last_activity": {"$exists": False}, "created_stamp": {"$lt": idle_cutoff}},
+        {"opponent_key": None, "filled": {"$ne": True}, "created_stamp": {"$lt": now - timedelta(seconds=unfilled_timeout)}}
+    ]}
@@ -0,0 +1,70 @@
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+
+if TYPE_CHECKING:
+    from src.entities.database_entity import DatabaseEntity
+
+# The identity map of the current request: every entity is loaded once per request and
+# saves of loaded entities are collected and written together when the request ends successfully
+class UnitOfWork():
+    def __init__(self) -> None:
+        self.entities: dict[tuple[type, str], 'DatabaseEntity'] = {}
+        self.pending: dict[tuple[type, str], 'DatabaseEntity'] = {}
+
+    # Return the already loaded entity matching a lookup by a unique field
+    def lookup(self, entity_class: type['DatabaseEntity'], filter: dict[str, Any]) -> Optional['DatabaseEntity']:
+        if len(filter) != 1:
+            return None
+        field, value = next(iter(filter.items()))
+        if field not in entity_class.get_unique_fields():
+            return None
+        for (mapped_class, _), entity in self.entities.items():
+            if mapped_class is entity_class and getattr(entity, field) == value:
+                return entity
+        return None
+
+    # Map the entity, if an instance with the same id is already mapped that instance is returned instead
+    def register(self, entity: 'DatabaseEntity') -> 'DatabaseEntity':
+        if not isinstance(entity.id, str):
+            return entity
+        return self.entities.setdefault((type(entity), entity.id), entity)
+
+    def add_pending(self, entity: 'DatabaseEntity') -> None:
+        entity = self.register(entity)
+        self.pending[(type(entity), entity.id)] = entity
+
+    def forget(self, entity: 'DatabaseEntity') -> None:
+        self.entities.pop((type(entity), entity.id), None)
+        self.pending.pop((type(entity), entity.id), None)
+
+    # Forget everything without writing, e.g. when the request failed halfway
+    def discard(self) -> None:
+        self.entities = {}
+        self.pending = {}
+
+    async def flush(self) -> None:
+        pending_by_class: dict[type, list['DatabaseEntity']] = {}
+        for (entity_class, _), entity in self.pending.items():
+            pending_by_class.setdefault(entity_class, []).append(entity)
+        self.pending = {}
+        for entity_class, entities in pending_by_class.items():
+            await entity_class.write_many(entities)
+
+CURRENT_UNIT_OF_WORK: ContextVar[Optional[UnitOfWork]] = ContextVar("CURRENT_UNIT_OF_WORK", default=None)
+
+def get_unit_of_work() -> Optional[UnitOfWork]:
+    return CURRENT_UNIT_OF_WORK.get()
+
+# A request dependency which opens a unit of work and flushes it once the endpoint is done,
+# if the endpoint raised the pending writes are discarded so a failed request changes nothing
+async def unit_of_work() -> AsyncIterator[UnitOfWork]:
+    unit = UnitOfWork()
+    token = CURRENT_UNIT_OF_WORK.set(unit)
+    try:
+        yield unit
+    except BaseException:
+        unit.discard()
+        raise
+    finally:
+        CURRENT_UNIT_OF_WORK.reset(token)
+    await unit.flush()
@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 from typing import Optional
 from src.database.collection import Collection
+from src.database.index import Index, ASCENDING
 from src.entities.database_entity import DatabaseEntity
 from src.entities.e2ee import E2EE
 from src.models.friend_models import FriendInformation, FriendList, FriendRequest, FriendRequests
@@ -9,7 +10,12 @@ from src.models.user_models import UserPrivateInformation, UserPublicInformation
 
 class User(DatabaseEntity):
     COLLECTION = Collection.USERS
-    UNIQUE_FIELDS = ["key", "name"]
+    INDEXES = [
+        Index(fields=[("key", ASCENDING)], unique=True),
+        Index(fields=[("name", ASCENDING)], unique=True)
+    ]
+    COUNTER_FIELDS = ["used_endpoints"]
+    TRUSTED_HYDRATION = True
     key: str
     name: str
     display_name: str
@@ -26,13 +32,6 @@ class User(DatabaseEntity):
             api_key = str(uuid.uuid4()).replace('-', '')
         return User(key=api_key, name=name.lower(), display_name=name)
     
-    def use_endpoint(self, endpoint: str) -> None:
-        if endpoint not in self.used_endpoints:
-            self.used_endpoints[endpoint] = 1
-        else:
-            self.used_endpoints[endpoint] += 1
-        self.last_access_stamp = datetime.now()
-
     def get_private_information(self) -> UserPrivateInformation:
         return UserPrivateInformation(
             name=self.name,
@@ -100,14 +99,9 @@ class User(DatabaseEntity):
     
     async def get_friend_list(self) -> FriendList:
         friend_information = []
+        users = await User.find_many_as(UserPublicInformation, field="key", values=list(self.friends.keys()))
         for user_key, date in self.friends.items():
-            user = await User.find_one(key=user_key)
-
-            if isinstance(user, User):
-                information = user.get_public_information()
-            else:
-                information = None
-
+            information = users.get(user_key, None)
             friend_information.append(FriendInformation(user=information, friends_since_stamp=int(date.timestamp())))
 
         return FriendList(
@@ -116,14 +110,9 @@ class User(DatabaseEntity):
     
     async def get_friend_requests(self) -> FriendRequests:
         requests = []
+        users = await User.find_many_as(UserPublicInformation, field="key", values=list(self.friend_requests.keys()))
         for user_key, date in self.friend_requests.items():
-            user = await User.find_one(key=user_key)
-
-            if isinstance(user, User):
-                information = user.get_public_information()
-            else:
-                information = None
-
+            information = users.get(user_key, None)
             requests.append(FriendRequest(user=information, received_stamp=int(date.timestamp())))
 
         return FriendRequests(
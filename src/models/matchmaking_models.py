@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# idle: Not queued
+# queued: Waiting for an opponent
+# matched: Paired, the room with the given code was created
+class MatchmakingStatus(BaseModel):
+    state: str
+    code: Optional[str] = None
+
+class MatchmakingStats(BaseModel):
+    queued: int
+    matches: int
+    average_wait: float
+    max_wait: float
@@ -6,6 +6,50 @@ class WsRcvMessage(BaseModel):
     encrypted_content: str
     sent_stamp: int
 
+# Everything needed to relay a message to a user
+class PmReceiver(BaseModel):
+    key: str
+    name: str
+    public_key: Optional[str] = None
+
+class PmSenderKeys(BaseModel):
+    public: Optional[str] = None
+
+# View of the user who sent a stored message
+class PmSender(BaseModel):
+    name: str
+    e2ee: PmSenderKeys = PmSenderKeys()
+
+class InboxMessage(BaseModel):
+    id: str
+    sender_name: Optional[str]
+    sender_public_key: Optional[str]
+    content: str
+    sent_stamp: int
+
+class InboxPage(BaseModel):
+    messages: list[InboxMessage]
+    cursor: Optional[str]
+
+# A message routed to the worker holding the websocket of its receiver
+class PmDelivery(BaseModel):
+    receiver_name: str
+    message_id: str
+    payload: str
+
+# Sizes are estimates of the memory held by the queued payloads
+class PmStats(BaseModel):
+    users: int
+    connections: int
+    queued: int
+    max_queue_depth: int
+    queued_bytes: int
+    bytes_per_connection: float
+    dropped: int
+    spilled: int
+    disconnected: int
+    reaped: int
+
 # 1: Invalid Message body
 # 2: Invalid User
 # 3: Success
@@ -18,4 +62,4 @@ class WsResponse(BaseModel):
 
 WS_INVALID_MESSAGE_BODY = WsResponse(code=1, message="Invalid message body.").model_dump_json()
 WS_USER_NOT_FOUND = WsResponse(code=2, message="User not found.").model_dump_json()
-WS_MESSAGE_DELIVERED = WsResponse(code=3, message="Message delivered.").model_dump_json()
\ No newline at end of file
+WS_MESSAGE_DELIVERED = WsResponse(code=3, message="Message delivered.").model_dump_json()
@@ -11,4 +11,8 @@ class RoomInformation(BaseModel):
     owner_ready: bool
     opponent_ready: bool
     created_stamp: int
-    is_ready: bool
\ No newline at end of file
+    is_ready: bool
+
+class RoomList(BaseModel):
+    rooms: list[RoomInformation]
+    cursor: Optional[str]
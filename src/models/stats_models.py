@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from src.models.matchmaking_models import MatchmakingStats
+from src.models.pm_models import PmStats
+
+class CacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+class ServerStats(BaseModel):
+    auth_cache: CacheStats
+    invalid_key_cache: CacheStats
+    room_list_cache: CacheStats
+    receiver_cache: CacheStats
+    matchmaking: MatchmakingStats
+    pm: PmStats
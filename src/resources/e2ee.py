@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Security, status, Header, Query, HTTPException
+from fastapi import APIRouter, Depends, Security, status, Header, Query, HTTPException
 from src.auth.api_key_authentication import user_validator, User
+from src.entities.unit_of_work import unit_of_work
 from src.models.base_models import ErrorMessage
 from src.models.e2ee_models import E2EEEncryptedPrivateKey, E2EEPublicKey
 
-router = APIRouter(prefix="/e2ee")
+router = APIRouter(prefix="/e2ee", dependencies=[Depends(unit_of_work)])
 
 # region post_e2ee
 @router.post(
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, Security, HTTPException, Query, status
+from typing import Optional
+from src.auth.api_key_authentication import user_validator, User
+from src.entities.message import Message
+from src.entities.unit_of_work import unit_of_work
+from src.models.base_models import ErrorMessage, SuccessMessage
+from src.models.pm_models import InboxPage
+
+router = APIRouter(prefix="/inbox", dependencies=[Depends(unit_of_work)])
+
+MAX_PAGE_SIZE = 100
+
+# region get_inbox
+@router.get(
+    "/",
+    tags=["Inbox"],
+    status_code=status.HTTP_200_OK,
+    response_model=InboxPage,
+    responses={
+        status.HTTP_200_OK: {"description": "Page of unread messages"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid cursor", "model": ErrorMessage},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="Unread",
+    description="Retrieve the private messages you received while offline, oldest first."
+)
+async def get_inbox(
+    user: User = Security(user_validator("get-inbox")),
+    limit: int = Query(
+        default=50,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description="The maximum number of messages to return."
+    ),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="The cursor of the previous page to continue from."
+    )
+) -> InboxPage:
+    try:
+        return await Message.get_inbox_page(receiver_key=user.key, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+# endregion
+
+
+# region post_read
+@router.post(
+    "/read",
+    tags=["Inbox"],
+    status_code=status.HTTP_200_OK,
+    response_model=SuccessMessage,
+    responses={
+        status.HTTP_200_OK: {"description": "Messages marked as read"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid message id", "model": ErrorMessage},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="Read",
+    description="Mark received messages as read."
+)
+async def post_read(
+    user: User = Security(user_validator("post-inbox-read")),
+    ids: list[str] = Query(
+        max_length=MAX_PAGE_SIZE,
+        description="The ids of the messages."
+    )
+) -> SuccessMessage:
+    try:
+        count = await Message.mark_read_many(receiver_key=user.key, message_ids=ids)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return SuccessMessage(message=f"Marked {count} messages as read.")
+# endregion
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, Security, HTTPException, Query, status
+from typing import Optional
+from src.auth.api_key_authentication import user_validator, User
+from src.entities.unit_of_work import unit_of_work
+from src.models.base_models import ErrorMessage, SuccessMessage
+from src.models.matchmaking_models import MatchmakingStatus
+from src.services.matchmaking import Matchmaker
+
+router = APIRouter(prefix="/matchmaking", dependencies=[Depends(unit_of_work)])
+
+# region get_matchmaking
+@router.get(
+    "/",
+    tags=["Matchmaking"],
+    status_code=status.HTTP_200_OK,
+    response_model=MatchmakingStatus,
+    responses={
+        status.HTTP_200_OK: {"description": "Matchmaking status"},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="Status",
+    description="Check if you are still queued or got matched into a room."
+)
+async def get_matchmaking(user: User = Security(user_validator("get-matchmaking"))) -> MatchmakingStatus:
+    return Matchmaker.get_instance().get_status(key=user.key)
+# endregion
+
+
+# region post_matchmaking
+@router.post(
+    "/",
+    tags=["Matchmaking"],
+    status_code=status.HTTP_200_OK,
+    response_model=MatchmakingStatus,
+    responses={
+        status.HTTP_200_OK: {"description": "Queued or matched"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Maximum room limit reached", "model": ErrorMessage},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="Queue",
+    description="Queue for a match. Once an opponent is found a room with both players is created."
+)
+async def post_matchmaking(
+    user: User = Security(user_validator("post-matchmaking")),
+    rating: Optional[int] = Query(
+        default=None,
+        ge=0,
+        description="Your rating, you are only matched with players of a similar rating."
+    )
+) -> MatchmakingStatus:
+    matchmaking_status = await Matchmaker.get_instance().enqueue(key=user.key, rating=rating)
+    if not isinstance(matchmaking_status, MatchmakingStatus):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Maximum room limit reached.")
+    return matchmaking_status
+# endregion
+
+
+# region delete_matchmaking
+@router.delete(
+    "/",
+    tags=["Matchmaking"],
+    status_code=status.HTTP_200_OK,
+    response_model=SuccessMessage,
+    responses={
+        status.HTTP_200_OK: {"description": "Left the queue"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Not queued", "model": ErrorMessage},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="Leave",
+    description="Leave the matchmaking queue."
+)
+async def delete_matchmaking(user: User = Security(user_validator("delete-matchmaking"))) -> SuccessMessage:
+    if not Matchmaker.get_instance().dequeue(key=user.key):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Not in queue.")
+    return SuccessMessage(message="Left queue.")
+# endregion
@@ -1,8 +1,15 @@
-from fastapi import APIRouter, Security, status
+from fastapi import APIRouter, Depends, Security, status
 from src.auth.api_key_authentication import user_validator, User
+from src.auth.auth_cache import AuthCache
+from src.entities.unit_of_work import unit_of_work
 from src.models.base_models import SuccessMessage
+from src.models.stats_models import ServerStats
+from src.services.matchmaking import Matchmaker
+from src.services.pm_hub import PmHub
+from src.services.receiver_cache import ReceiverCache
+from src.services.room_browser import RoomBrowser
 
-router = APIRouter()
+router = APIRouter(dependencies=[Depends(unit_of_work)])
 
 # region get_ping
 @router.get(
@@ -19,4 +26,29 @@ router = APIRouter()
 )
 async def get_ping(user: User = Security(user_validator("get-ping"))) -> SuccessMessage:
     return SuccessMessage(message="Pong")
-# endregion
\ No newline at end of file
+# endregion
+
+# region get_stats
+@router.get(
+    "/stats",
+    tags=["Miscellaneous"],
+    status_code=status.HTTP_200_OK,
+    response_model=ServerStats,
+    responses={
+        status.HTTP_200_OK: {"description": "Server statistics"},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="Statistics",
+    description="Retrieve runtime statistics of the server, like cache hit rates."
+)
+async def get_stats(user: User = Security(user_validator("get-stats"))) -> ServerStats:
+    auth_cache = AuthCache.get_instance()
+    return ServerStats(
+        auth_cache=auth_cache.users.get_stats(),
+        invalid_key_cache=auth_cache.invalid_keys.get_stats(),
+        room_list_cache=RoomBrowser.get_instance().pages.get_stats(),
+        receiver_cache=ReceiverCache.get_instance().receivers.get_stats(),
+        matchmaking=Matchmaker.get_instance().get_stats(),
+        pm=PmHub.get_instance().get_stats()
+    )
+# endregion
@@ -1,15 +1,20 @@
+from bson import ObjectId
 from datetime import date, datetime
 from fastapi import APIRouter, WebSocketDisconnect, WebSocket, HTTPException
 from src.auth.api_key_authentication import user_validator
 from src.entities.message import Message
 from src.entities.user import User
-from src.models.pm_models import WsRcvMessage, WsResponse, WS_INVALID_MESSAGE_BODY, WS_USER_NOT_FOUND, WS_MESSAGE_DELIVERED
+from src.models.pm_models import PmReceiver, WsRcvMessage, WsResponse, WS_INVALID_MESSAGE_BODY, WS_USER_NOT_FOUND, WS_MESSAGE_DELIVERED
+from src.services.message_writer import MessageWriter
+from src.services.pm_hub import PmHub
+from src.services.pm_session import PmSession
+from src.services.receiver_cache import ReceiverCache
 
 router = APIRouter(prefix="/pm")
 
-# region websocket
-ACTIVE_CONNECTIONS: dict[str, WebSocket] = {}
+INBOX_BATCH_SIZE = 100
 
+# region websocket
 @router.websocket("/ws")
 async def pm_websocket(websocket: WebSocket):
     # Check for api key header
@@ -28,38 +33,61 @@ async def pm_websocket(websocket: WebSocket):
     
     # Accept connection
     await websocket.accept()
-    ACTIVE_CONNECTIONS[sender.name] = websocket
+    hub = PmHub.get_instance()
+    session = await hub.connect(name=sender.name, websocket=websocket)
     try:
-        await pm_connection(sender=sender, websocket=websocket)
+        await drain_inbox(receiver=sender, session=session)
+        await pm_connection(sender=sender, websocket=websocket, session=session)
     except WebSocketDisconnect:
-        ACTIVE_CONNECTIONS.pop(sender.name, None)
+        pass
+    finally:
+        await hub.disconnect(session=session)
 
-async def pm_connection(sender: User, websocket: WebSocket) -> None:
+# Send the messages received while offline, every batch is marked as read with a single update before it is queued.
+# Messages which are not sent in the end are marked as unread again when the session stops.
+async def drain_inbox(receiver: User, session: PmSession) -> None:
+    while True:
+        messages, senders, cursor = await Message.get_inbox(receiver_key=receiver.key, limit=INBOX_BATCH_SIZE)
+        if len(messages) > 0:
+            await Message.mark_read_many(receiver_key=receiver.key, message_ids=[message.id for message in messages])
+        for index, message in enumerate(messages):
+            payload = message.get_ws_response(sender=senders.get(message.sender_key, None)).model_dump_json()
+            if not await session.send(payload=payload, message_id=message.id):
+                # The session closed meanwhile
+                await MessageWriter.get_instance().mark_unread_many([message.id for message in messages[index:]])
+                return
+        if cursor is None:
+            return
+
+# Responses go through the send queue of the session, so they keep their order with the messages for this user
+async def pm_connection(sender: User, websocket: WebSocket, session: PmSession) -> None:
     while True:
         json_data = await websocket.receive_text()
         try:
             response = WsRcvMessage.model_validate_json(json_data=json_data)
         except Exception:
-            await websocket.send_text(WS_INVALID_MESSAGE_BODY)
+            await session.send(WS_INVALID_MESSAGE_BODY)
             continue
-        username = response.receiver_username.lower()
-        receiver = await User.find_one(name=username)
-        if not isinstance(receiver, User):
-            await websocket.send_text(WS_USER_NOT_FOUND)
+        receiver = await ReceiverCache.get_instance().get_receiver(name=response.receiver_username)
+        if not isinstance(receiver, PmReceiver):
+            await session.send(WS_USER_NOT_FOUND)
             continue
 
-        await websocket.send_text(WS_MESSAGE_DELIVERED)
-
-        # Store message
-        message = Message(content=response.encrypted_content, sender_key=sender.key, receiver_key=receiver.key, sent_stamp=response.sent_stamp)
+        message = Message(id=str(ObjectId()), content=response.encrypted_content, sender_key=sender.key, receiver_key=receiver.key, sent_stamp=response.sent_stamp)
 
         # Send message to user
-        if receiver.name in ACTIVE_CONNECTIONS:
-            receiver_message = WsResponse(code=4, message=response.encrypted_content, sender_name=sender.name, sender_public_key=sender.e2ee.public)
-            await ACTIVE_CONNECTIONS[receiver.name].send_text(receiver_message.model_dump_json())
+        hub = PmHub.get_instance()
+        receiver_message = WsResponse(code=4, message=response.encrypted_content, sender_name=sender.name, sender_public_key=sender.e2ee.public).model_dump_json()
+        if hub.send_local(name=receiver.name, payload=receiver_message, message_id=message.id):
             now = datetime.now().timestamp()
             message.read = True
             message.read_stamp = int(now)
+        worker_ids = await hub.locate(name=receiver.name)
 
-        await message.save()
+        # Store message, devices connected to other workers get it through the backplane once it is stored
+        writer = MessageWriter.get_instance()
+        await writer.submit(message=message, wait=writer.durable_ack or len(worker_ids) > 0)
+        await session.send(WS_MESSAGE_DELIVERED)
+        for worker_id in worker_ids:
+            await hub.send_remote(worker_id=worker_id, name=receiver.name, message=message, payload=receiver_message)
 # endregion
\ No newline at end of file
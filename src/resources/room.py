@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Security, HTTPException, Query, status
+import asyncio
+from fastapi import APIRouter, Depends, Security, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from typing import Optional
 from src.auth.api_key_authentication import user_validator, User
+from src.entities.unit_of_work import unit_of_work
 from src.entities.room import Room
 from src.models.base_models import ErrorMessage, SuccessMessage
-from src.models.room_models import RoomCreationSuccess, RoomInformation
+from src.models.room_models import RoomCreationSuccess, RoomInformation, RoomList
+from src.services.room_broker import RoomBroker
+from src.services.room_browser import RoomBrowser, MAX_PAGE_SIZE
+from src.services.room_store import RoomStore
 
-router = APIRouter(prefix="/room")
+router = APIRouter(prefix="/room", dependencies=[Depends(unit_of_work)])
+# Websockets live for the whole connection and must not hold a unit of work
+websocket_router = APIRouter(prefix="/room")
+
+# Room state is reloaded at least this often, e.g. to notice rooms deleted by the sweeper
+ROOM_REFRESH_INTERVAL = 30.0
 
 # region get_status
 @router.get(
@@ -27,13 +38,47 @@ async def get_status(
     )
 ) -> RoomInformation:
     code = code.upper()
-    room = await Room.find_one(code=code)
+    room = await RoomStore.get_instance().get(code=code)
     if not isinstance(room, Room) or not room.visible_to(key=user.key):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
     return await room.get_information()
 # endregion
 
 
+# region get_list
+@router.get(
+    "/list",
+    tags=["Room"],
+    status_code=status.HTTP_200_OK,
+    response_model=RoomList,
+    responses={
+        status.HTTP_200_OK: {"description": "Page of public rooms"},
+        status.HTTP_400_BAD_REQUEST: {"description": "Invalid cursor", "model": ErrorMessage},
+        status.HTTP_403_FORBIDDEN: {"description": "Invalid api key"}
+    },
+    summary="List",
+    description="List public rooms which are waiting for an opponent, newest first. The list is refreshed every few seconds."
+)
+async def get_list(
+    user: User = Security(user_validator("get-room-list")),
+    limit: int = Query(
+        default=20,
+        ge=1,
+        le=MAX_PAGE_SIZE,
+        description="The maximum number of rooms to return."
+    ),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="The cursor of the previous page to continue from."
+    )
+) -> RoomList:
+    try:
+        return await RoomBrowser.get_instance().get_page(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+# endregion
+
+
 # region post_create
 @router.post(
     "/create",
@@ -58,7 +103,7 @@ async def post_create(
     room = await Room.create(owner_key=user.key, visibe=visible)
     if not isinstance(room, Room):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Maximum room limit reached.")
-    await room.save()
+    RoomStore.get_instance().add(room)
     return RoomCreationSuccess(code=room.code)
 # endregion
 
@@ -84,14 +129,16 @@ async def post_join(
     )
 ) -> None:
     code = code.upper()
-    room = await Room.find_one(code=code)
-    if not isinstance(room, Room):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
-    
-    success, message = room.join(key=user.key)
-    if not success:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
-    await room.save()
+    store = RoomStore.get_instance()
+    async with store.lock(code):
+        room = await store.get(code=code)
+        if not isinstance(room, Room):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
+        
+        success, message = room.join(key=user.key)
+        if not success:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
+        await store.save(room)
 # endregion
 
 
@@ -117,13 +164,19 @@ async def post_leave(
     )
 ) -> SuccessMessage:
     code = code.upper()
-    room = await Room.find_one(code=code)
-    if not isinstance(room, Room):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
-    
-    success, message = await room.leave(key=user.key)
-    if not success:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
+    store = RoomStore.get_instance()
+    async with store.lock(code):
+        room = await store.get(code=code)
+        if not isinstance(room, Room):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
+        
+        success, message = room.leave(key=user.key)
+        if not success:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
+        if user.key == room.owner_key:
+            await store.remove(room)
+        else:
+            await store.save(room)
     
     return SuccessMessage(message=message)
 # endregion
@@ -153,14 +206,80 @@ async def post_ready(
     )
 ) -> None:
     code = code.upper()
-    room = await Room.find_one(code=code)
-    if not isinstance(room, Room):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
-    
-    success, message = room.ready(key=user.key, state=state)
-    if not success:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
-    
-    await room.save()
+    store = RoomStore.get_instance()
+    async with store.lock(code):
+        room = await store.get(code=code)
+        if not isinstance(room, Room):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Room not found.")
+        
+        success, message = room.ready(key=user.key, state=state)
+        if not success:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
+        await store.save(room)
 # endregion
 
+
+# region websocket
+@websocket_router.websocket("/ws")
+async def room_websocket(websocket: WebSocket, code: str = Query(description="The code of the room.")):
+    # Check for api key header
+    api_key = websocket.headers.get("X-API-Key")
+    if api_key is None:
+        await websocket.close(code=1008)
+        return
+
+    # Validate api key
+    try:
+        validate = user_validator("room-websocket")
+        user = await validate(api_key)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+
+    code = code.upper()
+    room = await RoomStore.get_instance().get(code=code)
+    if not isinstance(room, Room) or not room.visible_to(key=user.key):
+        await websocket.close(code=4004, reason="Room not found.")
+        return
+
+    await websocket.accept()
+    broker = RoomBroker.get_instance()
+    changed = broker.subscribe(code=code)
+    try:
+        await room_connection(websocket=websocket, code=code, changed=changed)
+    finally:
+        broker.unsubscribe(code=code, event=changed)
+
+# Sends the room information on connect and whenever it changed, closes the connection once the room is gone
+async def room_connection(websocket: WebSocket, code: str, changed: asyncio.Event) -> None:
+    disconnected = asyncio.create_task(wait_for_disconnect(websocket=websocket))
+    store = RoomStore.get_instance()
+    last_information = None
+    try:
+        while True:
+            changed.clear()
+            room = await store.get(code=code)
+            if not isinstance(room, Room):
+                await websocket.close(code=1000, reason="Room closed.")
+                return
+            information = await room.get_information()
+            if information != last_information:
+                await websocket.send_text(information.model_dump_json())
+                last_information = information
+
+            wait_changed = asyncio.create_task(changed.wait())
+            done, _ = await asyncio.wait({wait_changed, disconnected}, timeout=ROOM_REFRESH_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            wait_changed.cancel()
+            if disconnected in done:
+                return
+    finally:
+        disconnected.cancel()
+
+# Clients don't send anything, receiving only notices when they disconnect
+async def wait_for_disconnect(websocket: WebSocket) -> None:
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+# endregion
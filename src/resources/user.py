@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Security, status, Query, HTTPException
+from fastapi import APIRouter, Depends, Security, status, Query, HTTPException
 from src.auth.api_key_authentication import user_validator, User
+from src.entities.unit_of_work import unit_of_work
 from src.models.base_models import ErrorMessage
 from src.models.user_models import UserPrivateInformation, UserPublicInformation
 
-router = APIRouter(prefix="/user")
+router = APIRouter(prefix="/user", dependencies=[Depends(unit_of_work)])
 
 # region get_user
 @router.get(
@@ -0,0 +1,31 @@
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+from src.models.pm_models import PmDelivery
+
+# Routes private messages to the worker holding the websocket of their receiver.
+# The presence registry maps the names of connected users to the ids of the workers holding their sessions,
+# a user connected with several devices can be on several workers. Deliveries published to a worker are passed
+# to the handler of that worker.
+class Backplane(ABC):
+    def __init__(self, worker_id: str, handler: Callable[[PmDelivery], Awaitable[None]]) -> None:
+        self.worker_id = worker_id
+        self.handler = handler
+
+    @abstractmethod
+    async def start(self) -> None: ...
+
+    @abstractmethod
+    async def stop(self) -> None: ...
+
+    @abstractmethod
+    async def register(self, name: str) -> None: ...
+
+    @abstractmethod
+    async def unregister(self, name: str) -> None: ...
+
+    # The ids of the workers the user is connected to
+    @abstractmethod
+    async def locate(self, name: str) -> list[str]: ...
+
+    @abstractmethod
+    async def publish(self, worker_id: str, delivery: PmDelivery) -> None: ...
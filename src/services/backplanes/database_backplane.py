@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from bson import ObjectId
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+from src.database.collection import Collection
+from src.database.database import Database
+from src.database.errors import UniqueKeyError
+from src.database.index import Index, ASCENDING
+from src.models.pm_models import PmDelivery
+from src.services.backplanes.backplane import Backplane
+from src.utils.time_operations import utc_now
+
+logger = logging.getLogger(__name__)
+
+# Deliveries nobody picked up, e.g. because their worker died, are removed after this many seconds
+DELIVERY_EXPIRY = 60
+MAX_BATCH_SIZE = 100
+# Workers refresh their presence entries every PRESENCE_REFRESH_INTERVAL seconds, entries of workers which stopped
+# doing so, e.g. because they crashed, are ignored after PRESENCE_EXPIRY seconds and removed by the database later
+PRESENCE_REFRESH_INTERVAL = 10.0
+PRESENCE_EXPIRY = 30
+
+# Backplane for multiple workers sharing the database: presence entries live in their own collection with one entry
+# per user and worker, every worker polls the deliveries addressed to it
+class DatabaseBackplane(Backplane):
+    def __init__(self, worker_id: str, handler: Callable[[PmDelivery], Awaitable[None]], poll_interval: float) -> None:
+        super().__init__(worker_id=worker_id, handler=handler)
+        self.poll_interval = poll_interval
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        db = Database.get_instance()
+        await db.create_indexes(collection=Collection.PRESENCE, indexes=[
+            Index(fields=[("name", ASCENDING), ("worker", ASCENDING)], unique=True),
+            Index(fields=[("worker", ASCENDING)]),
+            Index(fields=[("last_seen", ASCENDING)], expire_after_seconds=PRESENCE_EXPIRY)
+        ])
+        await db.create_indexes(collection=Collection.DELIVERIES, indexes=[
+            Index(fields=[("worker", ASCENDING), ("_id", ASCENDING)]),
+            Index(fields=[("created_stamp", ASCENDING)], expire_after_seconds=DELIVERY_EXPIRY)
+        ])
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await Database.get_instance().delete_many(collection=Collection.PRESENCE, worker=self.worker_id)
+
+    async def register(self, name: str) -> None:
+        db = Database.get_instance()
+        if await db.exists(collection=Collection.PRESENCE, name=name, worker=self.worker_id):
+            return
+        try:
+            await db.insert(collection=Collection.PRESENCE, document={"name": name, "worker": self.worker_id, "last_seen": utc_now()})
+        except UniqueKeyError:
+            pass
+
+    # Only removes the entry of this worker, other devices of the user might be connected elsewhere
+    async def unregister(self, name: str) -> None:
+        await Database.get_instance().delete_many(collection=Collection.PRESENCE, name=name, worker=self.worker_id)
+
+    async def locate(self, name: str) -> list[str]:
+        cutoff = utc_now() - timedelta(seconds=PRESENCE_EXPIRY)
+        entries = Database.get_instance().find(collection=Collection.PRESENCE, filter={"name": name, "last_seen": {"$gte": cutoff}}, projection=["worker"])
+        return [entry["worker"] async for entry in entries]
+
+    async def publish(self, worker_id: str, delivery: PmDelivery) -> None:
+        if worker_id == self.worker_id:
+            await self.handler(delivery)
+            return
+        document = delivery.model_dump() | {"worker": worker_id, "created_stamp": utc_now()}
+        await Database.get_instance().insert(collection=Collection.DELIVERIES, document=document)
+
+    # Keep the presence entries of this worker from expiring
+    async def refresh(self) -> int:
+        return await Database.get_instance().update_many(collection=Collection.PRESENCE, update={"$set": {"last_seen": utc_now()}}, worker=self.worker_id)
+
+    # Hand the pending deliveries of this worker to the handler and remove them, returns how many were handled.
+    # Deliveries are only removed once they were handled, so a crash in between delivers them again.
+    async def poll(self) -> int:
+        db = Database.get_instance()
+        documents = db.find(
+            collection=Collection.DELIVERIES,
+            filter={"worker": self.worker_id},
+            sort=[("_id", ASCENDING)],
+            limit=MAX_BATCH_SIZE,
+            batch_size=MAX_BATCH_SIZE
+        )
+        deliveries = [document async for document in documents]
+        if len(deliveries) == 0:
+            return 0
+        for document in deliveries:
+            try:
+                await self.handler(PmDelivery.model_validate(document))
+            except Exception:
+                logger.exception("Failed to handle private message delivery.")
+        await db.delete_many(collection=Collection.DELIVERIES, _id={"$in": [ObjectId(document["id"]) for document in deliveries]})
+        return len(deliveries)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        refreshed = loop.time()
+        while True:
+            if loop.time() - refreshed >= PRESENCE_REFRESH_INTERVAL:
+                refreshed = loop.time()
+                try:
+                    await self.refresh()
+                except Exception:
+                    logger.exception("Failed to refresh private message presence.")
+            try:
+                # Keep going without waiting while there is a backlog
+                if await self.poll() == MAX_BATCH_SIZE:
+                    continue
+            except Exception:
+                logger.exception("Failed to poll private message deliveries.")
+            await asyncio.sleep(self.poll_interval)
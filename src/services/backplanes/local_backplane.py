@@ -0,0 +1,27 @@
+from typing import Awaitable, Callable
+from src.models.pm_models import PmDelivery
+from src.services.backplanes.backplane import Backplane
+
+# Backplane for a single server process, every connected user belongs to this worker
+class LocalBackplane(Backplane):
+    def __init__(self, worker_id: str, handler: Callable[[PmDelivery], Awaitable[None]]) -> None:
+        super().__init__(worker_id=worker_id, handler=handler)
+        self.presence: set[str] = set()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        self.presence.clear()
+
+    async def register(self, name: str) -> None:
+        self.presence.add(name)
+
+    async def unregister(self, name: str) -> None:
+        self.presence.discard(name)
+
+    async def locate(self, name: str) -> list[str]:
+        return [self.worker_id] if name in self.presence else []
+
+    async def publish(self, worker_id: str, delivery: PmDelivery) -> None:
+        await self.handler(delivery)
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+from src.database.collection import Collection
+from src.database.database import Database
+
+logger = logging.getLogger(__name__)
+
+# Aggregates endpoint usage in memory and writes it to the users in periodic batches,
+# keeping the usage bookkeeping out of the request path
+class EndpointUsageTracker():
+    _instance = None
+
+    def __init__(self) -> None:
+        if EndpointUsageTracker._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of EndpointUsageTracker.")
+        self.used_endpoints: dict[str, dict[str, int]] = {}
+        self.last_access: dict[str, datetime] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def get_instance() -> 'EndpointUsageTracker':
+        if EndpointUsageTracker._instance is None:
+            EndpointUsageTracker._instance = EndpointUsageTracker()
+        return EndpointUsageTracker._instance
+    
+    def record(self, key: str, endpoint: str) -> None:
+        counters = self.used_endpoints.setdefault(key, {})
+        counters[endpoint] = counters.get(endpoint, 0) + 1
+        self.last_access[key] = datetime.now()
+
+    def get_pending_count(self) -> int:
+        return len(self.last_access)
+
+    async def flush(self) -> None:
+        if len(self.last_access) == 0:
+            return
+        used_endpoints, last_access = self.used_endpoints, self.last_access
+        self.used_endpoints, self.last_access = {}, {}
+
+        operations = []
+        for key, stamp in last_access.items():
+            update: dict[str, dict] = {"$max": {"last_access_stamp": stamp}}
+            counters = used_endpoints.get(key, {})
+            if len(counters) > 0:
+                update["$inc"] = {f"used_endpoints.{endpoint}": count for endpoint, count in counters.items()}
+            operations.append(({"key": key}, update))
+        try:
+            await Database.get_instance().bulk_update(collection=Collection.USERS, operations=operations)
+        except BaseException:
+            self.merge(used_endpoints=used_endpoints, last_access=last_access)
+            raise
+
+    # Put usage back which could not be written, so the next flush includes it
+    def merge(self, used_endpoints: dict[str, dict[str, int]], last_access: dict[str, datetime]) -> None:
+        for key, counters in used_endpoints.items():
+            current = self.used_endpoints.setdefault(key, {})
+            for endpoint, count in counters.items():
+                current[endpoint] = current.get(endpoint, 0) + count
+        for key, stamp in last_access.items():
+            self.last_access[key] = max(stamp, self.last_access.get(key, stamp))
+
+    def start(self, interval: float) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(interval=interval))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            task, self.task = self.task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write endpoint usage.")
@@ -0,0 +1,165 @@
+import heapq
+import itertools
+import time
+from typing import Optional
+from src.entities.config import Config
+from src.entities.room import MAX_ROOM_COUNT, Room, generate_code
+from src.models.matchmaking_models import MatchmakingStats, MatchmakingStatus
+from src.utils.lru_cache import LRUCache
+
+# Bucket of players who queued without a rating
+NO_RATING = None
+
+# Pairs queued players in memory, every bucket is a heap ordered by queue time so the longest waiting player is matched first.
+# Leaving the queue only drops the player from the entries, stale heap items are skipped when they reach the top.
+# Players who waited longer than the queue timeout are dropped, they most likely stopped checking their status.
+class Matchmaker():
+    _instance = None
+
+    def __init__(self) -> None:
+        if Matchmaker._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of Matchmaker.")
+        config = Config.load_state()
+        self.bucket_width = config.matchmaking_bucket_width
+        self.queue_timeout = config.matchmaking_queue_timeout
+        self.buckets: dict[Optional[int], list[tuple[float, int, str]]] = {}
+        self.bucket_sizes: dict[Optional[int], int] = {}
+        # Key of each queued player mapped to its queue time, sequence number and bucket
+        self.entries: dict[str, tuple[float, int, Optional[int]]] = {}
+        # Keys of players whose request is being handled, e.g. while their room is created
+        self.pending: set[str] = set()
+        self.sequence = itertools.count()
+        self.results = LRUCache(max_size=config.matchmaking_result_cache_size, ttl=config.matchmaking_result_ttl)
+        self.matches = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def get_instance() -> 'Matchmaker':
+        if Matchmaker._instance is None:
+            Matchmaker._instance = Matchmaker()
+        return Matchmaker._instance
+
+    def get_bucket(self, rating: Optional[int]) -> Optional[int]:
+        if rating is None:
+            return NO_RATING
+        return rating // self.bucket_width
+
+    # Queue the player or pair it with the longest waiting player of its own or a neighbouring bucket.
+    # The longest waiting player owns the room, players who reached the room limit can't queue.
+    async def enqueue(self, key: str, rating: Optional[int] = None) -> Optional[MatchmakingStatus]:
+        if self.is_waiting(key) or key in self.pending:
+            return MatchmakingStatus(state="queued")
+        self.pending.add(key)
+        try:
+            if await Room.count(limit=MAX_ROOM_COUNT, owner_key=key) >= MAX_ROOM_COUNT:
+                return None
+            self.results.invalidate(key)
+            return await self.match(key=key, bucket=self.get_bucket(rating))
+        finally:
+            self.pending.discard(key)
+
+    async def match(self, key: str, bucket: Optional[int]) -> MatchmakingStatus:
+        while True:
+            opponent = self.pop_opponent(bucket=bucket)
+            if opponent is None:
+                self.push(key=key, bucket=bucket, enqueued=time.monotonic(), sequence=next(self.sequence))
+                return MatchmakingStatus(state="queued")
+            opponent_key, enqueued, sequence, opponent_bucket = opponent
+            self.pending.add(opponent_key)
+            try:
+                # The opponent created rooms of its own while waiting
+                if await Room.count(limit=MAX_ROOM_COUNT, owner_key=opponent_key) >= MAX_ROOM_COUNT:
+                    continue
+                room = Room(owner_key=opponent_key, opponent_key=key, code=generate_code())
+                await room.insert_with_unique_code()
+            except Exception:
+                # Give the opponent its place in the queue back
+                if opponent_key not in self.entries:
+                    self.push(key=opponent_key, bucket=opponent_bucket, enqueued=enqueued, sequence=sequence)
+                raise
+            finally:
+                self.pending.discard(opponent_key)
+            return self.record_match(key=key, opponent_key=opponent_key, enqueued=enqueued, code=room.code)
+
+    def record_match(self, key: str, opponent_key: str, enqueued: float, code: str) -> MatchmakingStatus:
+        wait = time.monotonic() - enqueued
+        self.matches += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.results.put(opponent_key, code)
+        self.results.put(key, code)
+        return MatchmakingStatus(state="matched", code=code)
+
+    def dequeue(self, key: str) -> bool:
+        if not self.is_waiting(key):
+            return False
+        entry = self.entries.pop(key)
+        bucket = entry[2]
+        self.bucket_sizes[bucket] -= 1
+        # Rebuild heaps which are mostly made of players who left
+        heap = self.buckets[bucket]
+        if len(heap) > 2 * self.bucket_sizes[bucket] + 64:
+            heap[:] = [item for item in heap if self.is_queued(item)]
+            heapq.heapify(heap)
+        return True
+
+    def get_status(self, key: str) -> MatchmakingStatus:
+        if self.is_waiting(key) or key in self.pending:
+            return MatchmakingStatus(state="queued")
+        code = self.results.get(key)
+        if code is not None:
+            return MatchmakingStatus(state="matched", code=code)
+        return MatchmakingStatus(state="idle")
+
+    def push(self, key: str, bucket: Optional[int], enqueued: float, sequence: int) -> None:
+        self.entries[key] = (enqueued, sequence, bucket)
+        self.bucket_sizes[bucket] = self.bucket_sizes.get(bucket, 0) + 1
+        heapq.heappush(self.buckets.setdefault(bucket, []), (enqueued, sequence, key))
+
+    def pop_opponent(self, bucket: Optional[int]) -> Optional[tuple[str, float, int, Optional[int]]]:
+        candidates = [bucket] if bucket is NO_RATING else [bucket - 1, bucket, bucket + 1]
+        oldest = None
+        for candidate in candidates:
+            item = self.peek(candidate)
+            if item is not None and (oldest is None or item < oldest[0]):
+                oldest = (item, candidate)
+        if oldest is None:
+            return None
+        (enqueued, sequence, key), candidate = oldest
+        heapq.heappop(self.buckets[candidate])
+        del self.entries[key]
+        self.bucket_sizes[candidate] -= 1
+        return key, enqueued, sequence, candidate
+
+    # Oldest queued player of the bucket, drops stale and timed out items on the way
+    def peek(self, bucket: Optional[int]) -> Optional[tuple[float, int, str]]:
+        heap = self.buckets.get(bucket, None)
+        if heap is None:
+            return None
+        while len(heap) > 0 and not (self.is_queued(heap[0]) and self.is_waiting(heap[0][2])):
+            heapq.heappop(heap)
+        return heap[0] if len(heap) > 0 else None
+
+    # Whether the player is queued and did not time out, timed out players are dropped
+    def is_waiting(self, key: str) -> bool:
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return False
+        if time.monotonic() - entry[0] <= self.queue_timeout:
+            return True
+        del self.entries[key]
+        self.bucket_sizes[entry[2]] -= 1
+        return False
+
+    def is_queued(self, item: tuple[float, int, str]) -> bool:
+        entry = self.entries.get(item[2], None)
+        return entry is not None and entry[1] == item[1]
+
+    def get_stats(self) -> MatchmakingStats:
+        return MatchmakingStats(
+            queued=len(self.entries),
+            matches=self.matches,
+            average_wait=self.total_wait / self.matches if self.matches > 0 else 0.0,
+            max_wait=self.max_wait
+        )
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from bson import ObjectId
+from typing import Optional
+from src.entities.config import Config
+from src.entities.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Stores private messages in batches, senders only wait for the queue unless they need the message to be stored.
+# Messages without an id get one when they are queued, so they can be referenced before they are written.
+# Failed batches are retried until they are stored, messages are never dropped.
+class MessageWriter():
+    _instance = None
+
+    def __init__(self) -> None:
+        if MessageWriter._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of MessageWriter.")
+        config = Config.load_state()
+        self.queue_size = config.pm_write_queue_size
+        self.batch_size = config.pm_write_batch_size
+        self.interval = config.pm_write_interval
+        self.durable_ack = config.pm_durable_ack
+        self.retry_delay = config.pm_write_retry_delay
+        self.max_retry_delay = config.pm_write_max_retry_delay
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        # Messages which are queued or being written by id
+        self.pending: dict[str, Message] = {}
+        # Ids of messages in the batch being written which have to be marked as unread once it is stored
+        self.writing: set[str] = set()
+        self.unread: set[str] = set()
+        self.written_count = 0
+        self.retry_count = 0
+
+    @staticmethod
+    def get_instance() -> 'MessageWriter':
+        if MessageWriter._instance is None:
+            MessageWriter._instance = MessageWriter()
+        return MessageWriter._instance
+
+    # Queue the message, waits while the queue is full and with wait until the message is stored
+    async def submit(self, message: Message, wait: bool = False) -> None:
+        # Without a running writer, e.g. in scripts, messages are written right away
+        if self.queue is None:
+            await Message.insert_many([message])
+            return
+        if message.id is None:
+            message.id = str(ObjectId())
+        stored = asyncio.get_running_loop().create_future() if wait else None
+        self.pending[message.id] = message
+        await self.queue.put((message, stored))
+        if stored is not None:
+            await stored
+
+    # Mark messages as unread, also when they are not stored yet
+    async def mark_unread_many(self, message_ids: list[str]) -> None:
+        stored = []
+        for message_id in message_ids:
+            message = self.pending.get(message_id, None)
+            if message is None:
+                stored.append(message_id)
+                continue
+            message.read = False
+            message.read_stamp = None
+            # The batch of the message might have been serialized already
+            if message_id in self.writing:
+                self.unread.add(message_id)
+        if len(stored) > 0:
+            await Message.mark_unread_many(stored)
+
+    def get_pending_count(self) -> int:
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def start(self) -> None:
+        if self.task is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            self.task = asyncio.create_task(self.run(queue=self.queue))
+
+    # Write everything that is still queued and stop the writer
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        queue, task = self.queue, self.task
+        self.queue, self.task = None, None
+        await queue.put(None)
+        await task
+
+    async def run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        stopped = False
+        while not stopped:
+            item = await queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                if queue.qsize() > 0:
+                    item = queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            await self.write(batch)
+
+    async def write(self, batch: list[tuple[Message, Optional[asyncio.Future]]]) -> None:
+        messages = [message for message, _ in batch]
+        self.writing = {message.id for message in messages}
+        delay = self.retry_delay
+        while True:
+            try:
+                await Message.insert_many(messages)
+                break
+            except Exception:
+                logger.exception(f"Failed to store {len(messages)} private messages, retrying in {delay} seconds.")
+            self.retry_count += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+            # Part of the batch might have been stored before the write failed
+            try:
+                stored_ids = await Message.get_stored_ids([message.id for message in messages])
+                messages = [message for message in messages if message.id not in stored_ids]
+            except Exception:
+                continue
+            if len(messages) == 0:
+                break
+        self.writing = set()
+        for message, _ in batch:
+            self.pending.pop(message.id, None)
+        if len(self.unread) > 0:
+            unread, self.unread = list(self.unread), set()
+            try:
+                await Message.mark_unread_many(unread)
+            except Exception:
+                logger.exception(f"Failed to mark {len(unread)} private messages as unread.")
+        self.written_count += len(batch)
+        for _, stored in batch:
+            if stored is not None and not stored.done():
+                stored.set_result(None)
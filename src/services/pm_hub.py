@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import uuid
+from fastapi import WebSocket
+from typing import Awaitable, Callable, Optional
+from src.entities.config import Config
+from src.entities.message import Message
+from src.models.pm_models import PmDelivery, PmStats
+from src.services.backplanes.backplane import Backplane
+from src.services.backplanes.database_backplane import DatabaseBackplane
+from src.services.backplanes.local_backplane import LocalBackplane
+from src.services.message_writer import MessageWriter
+from src.services.pm_session import PmSession
+
+logger = logging.getLogger(__name__)
+
+# Holds the private message sessions of this worker, a user can be connected with several devices at once.
+# Messages for users connected to other workers are routed through the backplane, remote deliveries are marked
+# as read by the worker which delivered them. Dead sockets are found by the websocket pings of the server and by
+# failing sends, closed sessions are reaped on a timer even if their connection never noticed.
+class PmHub():
+    _instance = None
+
+    def __init__(self) -> None:
+        if PmHub._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of PmHub.")
+        self.worker_id = uuid.uuid4().hex
+        self.connections: dict[str, list[PmSession]] = {}
+        config = Config.load_state()
+        self.send_queue_size = config.pm_send_queue_size
+        self.send_timeout = config.pm_send_timeout
+        self.overflow_policy = config.pm_overflow_policy
+        self.reap_interval = config.pm_reap_interval
+        self.task: Optional[asyncio.Task] = None
+        # Counts of sessions which already disconnected
+        self.dropped_count = 0
+        self.spilled_count = 0
+        self.disconnected_count = 0
+        self.reaped_count = 0
+        self.backplane = create_backplane(config=config, worker_id=self.worker_id, handler=self.receive)
+
+    @staticmethod
+    def get_instance() -> 'PmHub':
+        if PmHub._instance is None:
+            PmHub._instance = PmHub()
+        return PmHub._instance
+
+    async def start(self) -> None:
+        await self.backplane.start()
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.backplane.stop()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("Failed to reap private message connections.")
+
+    # Remove sessions which were closed because sending to them failed or timed out
+    async def reap(self) -> int:
+        reaped = 0
+        for sessions in list(self.connections.values()):
+            for session in [session for session in sessions if session.closed]:
+                await self.disconnect(session)
+                reaped += 1
+        self.reaped_count += reaped
+        return reaped
+
+    async def connect(self, name: str, websocket: WebSocket) -> PmSession:
+        session = PmSession(
+            name=name,
+            websocket=websocket,
+            queue_size=self.send_queue_size,
+            send_timeout=self.send_timeout,
+            overflow_policy=self.overflow_policy
+        )
+        session.start()
+        sessions = self.connections.setdefault(name, [])
+        sessions.append(session)
+        if len(sessions) == 1:
+            await self.backplane.register(name)
+        return session
+
+    # Called by the connection itself and by the reaper, only the first call does anything
+    async def disconnect(self, session: PmSession) -> None:
+        sessions = self.connections.get(session.name, [])
+        if session not in sessions:
+            return
+        sessions.remove(session)
+        unsent = await session.stop()
+        self.dropped_count += session.dropped_count
+        self.spilled_count += session.spilled_count
+        self.disconnected_count += int(session.overflowed)
+        if len(sessions) == 0:
+            del self.connections[session.name]
+            await self.backplane.unregister(session.name)
+        if len(unsent) > 0:
+            await MessageWriter.get_instance().mark_unread_many(unsent)
+
+    def is_connected(self, name: str) -> bool:
+        return name in self.connections
+
+    # Queue the message for every device of a user connected to this worker, returns if it counts as delivered
+    def send_local(self, name: str, payload: str, message_id: Optional[str] = None) -> bool:
+        delivered = False
+        for session in self.connections.get(name, []):
+            delivered = session.offer(payload=payload, message_id=message_id) or delivered
+        return delivered
+
+    # The other workers the user is connected to
+    async def locate(self, name: str) -> list[str]:
+        return [worker_id for worker_id in await self.backplane.locate(name) if worker_id != self.worker_id]
+
+    # Publish a stored message to the worker of the receiver
+    async def send_remote(self, worker_id: str, name: str, message: Message, payload: str) -> None:
+        await self.backplane.publish(worker_id, PmDelivery(receiver_name=name, message_id=message.id, payload=payload))
+
+    async def receive(self, delivery: PmDelivery) -> None:
+        if self.send_local(name=delivery.receiver_name, payload=delivery.payload, message_id=delivery.message_id):
+            await Message.mark_read(delivery.message_id)
+
+    def get_stats(self) -> PmStats:
+        sessions = [session for user_sessions in self.connections.values() for session in user_sessions]
+        depths = [session.get_queue_depth() for session in sessions]
+        queued_bytes = sum(session.queued_bytes for session in sessions)
+        return PmStats(
+            users=len(self.connections),
+            connections=len(sessions),
+            queued=sum(depths),
+            max_queue_depth=max(depths, default=0),
+            queued_bytes=queued_bytes,
+            bytes_per_connection=queued_bytes / len(sessions) if len(sessions) > 0 else 0.0,
+            dropped=self.dropped_count + sum(session.dropped_count for session in sessions),
+            spilled=self.spilled_count + sum(session.spilled_count for session in sessions),
+            disconnected=self.disconnected_count + sum(int(session.overflowed) for session in sessions),
+            reaped=self.reaped_count
+        )
+
+def create_backplane(config: Config, worker_id: str, handler: Callable[[PmDelivery], Awaitable[None]]) -> Backplane:
+    match config.pm_backplane:
+        case "local":
+            return LocalBackplane(worker_id=worker_id, handler=handler)
+        case "database":
+            return DatabaseBackplane(worker_id=worker_id, handler=handler, poll_interval=config.pm_backplane_poll_interval)
+        case _:
+            raise RuntimeError(f"Unknown private message backplane '{config.pm_backplane}'.")
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import sys
+from fastapi import WebSocket
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# What happens to messages arriving while the send queue of the receiver is full:
+# drop: The live copy is discarded, the message stays unread in the inbox of the receiver
+# disconnect: The receiver is disconnected and gets the message from its inbox on reconnect
+# spill: The message goes to the inbox of the receiver, since every message is stored this only differs from drop in its counter
+OVERFLOW_POLICIES = ["drop", "disconnect", "spill"]
+
+# A private message websocket with its own bounded send queue, a writer task drains the queue
+# so a slow receiver never blocks the connection sending to it
+class PmSession():
+    def __init__(self, name: str, websocket: WebSocket, queue_size: int, send_timeout: float, overflow_policy: str) -> None:
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise RuntimeError(f"Unknown overflow policy '{overflow_policy}'.")
+        self.name = name
+        self.websocket = websocket
+        self.send_timeout = send_timeout
+        self.overflow_policy = overflow_policy
+        # Payloads with the id of the message they deliver, if any
+        self.queue: asyncio.Queue[tuple[str, Optional[str]]] = asyncio.Queue(maxsize=queue_size)
+        # The item the writer is sending, it only counts as sent once the send returned
+        self.sending: Optional[tuple[str, Optional[str]]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.close_task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.overflowed = False
+        self.queued_bytes = 0
+        self.dropped_count = 0
+        self.spilled_count = 0
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    # Queue a message for the receiver without waiting, returns if it counts as delivered
+    def offer(self, payload: str, message_id: Optional[str] = None) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait((payload, message_id))
+            self.queued_bytes += sys.getsizeof(payload)
+            return True
+        except asyncio.QueueFull:
+            pass
+        match self.overflow_policy:
+            case "drop":
+                self.dropped_count += 1
+                return False
+            case "disconnect":
+                self.overflowed = True
+                self.close(code=1013, reason="Receiving too slowly.")
+                return False
+            case _:
+                self.spilled_count += 1
+                return False
+
+    # Queue a payload for the connection itself, waits while the queue is full, returns if it was queued
+    async def send(self, payload: str, message_id: Optional[str] = None) -> bool:
+        if self.closed:
+            return False
+        await self.queue.put((payload, message_id))
+        self.queued_bytes += sys.getsizeof(payload)
+        return True
+
+    def get_queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                self.sending = await self.queue.get()
+                payload = self.sending[0]
+                self.queued_bytes -= sys.getsizeof(payload)
+                await asyncio.wait_for(self.deliver(payload), timeout=self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.info(f"Closing private message connection of {self.name} after a failed send.")
+            self.close(code=1011, reason="Sending failed.")
+
+    # Clears the item right after the send returned, so stopping the writer in between does not count it as unsent
+    async def deliver(self, payload: str) -> None:
+        await self.websocket.send_text(payload)
+        self.sending = None
+
+    def close(self, code: int, reason: str) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.close_task = asyncio.create_task(self.close_websocket(code=code, reason=reason))
+
+    async def close_websocket(self, code: int, reason: str) -> None:
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    # Stop the writer, returns the ids of the messages which were not sent
+    async def stop(self) -> list[str]:
+        self.closed = True
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        unsent = []
+        if self.sending is not None and self.sending[1] is not None:
+            unsent.append(self.sending[1])
+        self.sending = None
+        while self.queue.qsize() > 0:
+            _, message_id = self.queue.get_nowait()
+            if message_id is not None:
+                unsent.append(message_id)
+        self.queued_bytes = 0
+        if self.close_task is not None:
+            await self.close_task
+            self.close_task = None
+        return unsent
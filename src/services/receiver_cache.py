@@ -0,0 +1,40 @@
+from typing import Optional
+from src.entities.config import Config
+from src.entities.database_entity import DatabaseEntity
+from src.entities.user import User
+from src.models.pm_models import PmReceiver
+from src.utils.lru_cache import LRUCache
+
+# Resolves private message receivers by name, so relaying messages to known receivers needs no database query.
+# Entries are dropped whenever the user is written or deleted through its entity.
+class ReceiverCache():
+    _instance = None
+
+    def __init__(self) -> None:
+        if ReceiverCache._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of ReceiverCache.")
+        config = Config.load_state()
+        self.receivers = LRUCache(max_size=config.pm_receiver_cache_size, ttl=config.pm_receiver_cache_ttl)
+        User.on_write(self.invalidate_user)
+
+    @staticmethod
+    def get_instance() -> 'ReceiverCache':
+        if ReceiverCache._instance is None:
+            ReceiverCache._instance = ReceiverCache()
+        return ReceiverCache._instance
+
+    async def get_receiver(self, name: str) -> Optional[PmReceiver]:
+        name = name.lower()
+        receiver = self.receivers.get(name)
+        if receiver is not None:
+            return receiver
+        user = await User.find_one(name=name)
+        if not isinstance(user, User):
+            return None
+        receiver = PmReceiver(key=user.key, name=user.name, public_key=user.e2ee.public)
+        self.receivers.put(name, receiver)
+        return receiver
+
+    def invalidate_user(self, user: DatabaseEntity) -> None:
+        if isinstance(user, User):
+            self.receivers.invalidate(user.name)
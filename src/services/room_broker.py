@@ -0,0 +1,44 @@
+import asyncio
+from src.entities.database_entity import DatabaseEntity
+from src.entities.room import Room
+
+# Signals subscribers of a room whenever the room is written or deleted.
+# Signals only carry the room code, bursts of changes collapse into one wake up per subscriber.
+class RoomBroker():
+    _instance = None
+
+    def __init__(self) -> None:
+        if RoomBroker._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of RoomBroker.")
+        self.subscribers: dict[str, set[asyncio.Event]] = {}
+        Room.on_write(self.room_written)
+
+    @staticmethod
+    def get_instance() -> 'RoomBroker':
+        if RoomBroker._instance is None:
+            RoomBroker._instance = RoomBroker()
+        return RoomBroker._instance
+
+    def subscribe(self, code: str) -> asyncio.Event:
+        event = asyncio.Event()
+        self.subscribers.setdefault(code, set()).add(event)
+        return event
+
+    def unsubscribe(self, code: str, event: asyncio.Event) -> None:
+        events = self.subscribers.get(code, None)
+        if events is None:
+            return
+        events.discard(event)
+        if len(events) == 0:
+            del self.subscribers[code]
+
+    def publish(self, code: str) -> None:
+        for event in self.subscribers.get(code, ()):
+            event.set()
+
+    def room_written(self, room: DatabaseEntity) -> None:
+        if isinstance(room, Room):
+            self.publish(room.code)
+
+    def get_subscriber_count(self) -> int:
+        return sum(len(events) for events in self.subscribers.values())
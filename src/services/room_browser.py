@@ -0,0 +1,27 @@
+from typing import Optional
+from src.entities.config import Config
+from src.entities.room import Room
+from src.models.room_models import RoomList
+from src.utils.snapshot_cache import SnapshotCache
+
+MAX_PAGE_SIZE = 50
+
+# Serves pages of the public room list from a short-lived snapshot shared by all clients,
+# so lobby refreshes cost at most one query per page and ttl no matter how many clients browse
+class RoomBrowser():
+    _instance = None
+
+    def __init__(self) -> None:
+        if RoomBrowser._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of RoomBrowser.")
+        config = Config.load_state()
+        self.pages = SnapshotCache(max_size=config.room_list_cache_size, ttl=config.room_list_cache_ttl)
+
+    @staticmethod
+    def get_instance() -> 'RoomBrowser':
+        if RoomBrowser._instance is None:
+            RoomBrowser._instance = RoomBrowser()
+        return RoomBrowser._instance
+
+    async def get_page(self, limit: int, cursor: Optional[str] = None) -> RoomList:
+        return await self.pages.get(key=(limit, cursor), loader=lambda: Room.list_open(limit=limit, cursor=cursor))
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from src.entities.config import Config
+from src.entities.room import Room
+
+logger = logging.getLogger(__name__)
+
+# Holds active rooms in memory as the authoritative state and writes their changes behind in batches.
+# Rooms which are not in memory are loaded from the database on first use.
+# Mutations of a room are serialized with its lock, which only works within a single server process.
+# With several processes the store is write-through instead: rooms are read from and written to the database on every use.
+class RoomStore():
+    _instance = None
+
+    def __init__(self) -> None:
+        if RoomStore._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of RoomStore.")
+        self.idle_timeout = Config.load_state().room_store_idle_timeout
+        self.rooms: dict[str, Room] = {}
+        self.last_used: dict[str, float] = {}
+        # Locks only exist while a request holds or waits for them
+        self.locks: dict[str, asyncio.Lock] = {}
+        self.lock_users: dict[str, int] = {}
+        self.dirty: set[str] = set()
+        self.write_through = False
+        self.task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def get_instance() -> 'RoomStore':
+        if RoomStore._instance is None:
+            RoomStore._instance = RoomStore()
+        return RoomStore._instance
+
+    async def get(self, code: str) -> Optional[Room]:
+        if self.write_through:
+            room = await Room.find_one(code=code)
+            return room if isinstance(room, Room) else None
+        room = self.rooms.get(code, None)
+        if room is None:
+            room = await Room.find_one(code=code)
+            if not isinstance(room, Room):
+                return None
+            # Another request might have loaded the room in the meantime
+            room = self.rooms.setdefault(code, room)
+        self.last_used[code] = time.monotonic()
+        return room
+
+    def add(self, room: Room) -> None:
+        if self.write_through:
+            return
+        self.rooms[room.code] = room
+        self.last_used[room.code] = time.monotonic()
+
+    @asynccontextmanager
+    async def lock(self, code: str) -> AsyncIterator[None]:
+        lock = self.locks.setdefault(code, asyncio.Lock())
+        self.lock_users[code] = self.lock_users.get(code, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.lock_users[code] -= 1
+            if self.lock_users[code] == 0:
+                del self.lock_users[code]
+                del self.locks[code]
+
+    # Subscribers see changes right away, the database catches up with the next flush
+    async def save(self, room: Room) -> None:
+        if self.write_through:
+            await room.write()
+            return
+        self.dirty.add(room.code)
+        room.notify_write()
+
+    async def remove(self, room: Room) -> None:
+        self.rooms.pop(room.code, None)
+        self.last_used.pop(room.code, None)
+        self.dirty.discard(room.code)
+        await room.delete()
+
+    async def flush(self) -> None:
+        if len(self.dirty) > 0:
+            codes, self.dirty = self.dirty, set()
+            rooms = [self.rooms[code] for code in codes if code in self.rooms]
+            # Also when the flush is cancelled, otherwise the changes would be lost
+            try:
+                await Room.write_many(rooms)
+            except BaseException:
+                self.dirty |= codes
+                raise
+        self.evict_idle()
+
+    def evict_idle(self) -> None:
+        cutoff = time.monotonic() - self.idle_timeout
+        for code, last_used in list(self.last_used.items()):
+            if last_used > cutoff or code in self.dirty or code in self.locks:
+                continue
+            self.rooms.pop(code, None)
+            del self.last_used[code]
+
+    # Forget rooms which the sweeper deleted from the database
+    def drop_expired(self, idle_timeout: float, unfilled_timeout: float) -> None:
+        for room in [room for room in self.rooms.values() if room.is_expired(idle_timeout=idle_timeout, unfilled_timeout=unfilled_timeout)]:
+            self.rooms.pop(room.code, None)
+            self.last_used.pop(room.code, None)
+            self.dirty.discard(room.code)
+            room.notify_write()
+
+    def start(self, interval: float, write_through: bool = False) -> None:
+        self.write_through = write_through
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(interval=interval))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            task, self.task = self.task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write rooms.")
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Optional
+from src.entities.room import Room, get_expired_filter
+from src.services.room_store import RoomStore
+
+logger = logging.getLogger(__name__)
+
+# Periodically deletes abandoned rooms, so they stop counting against the room limit of their owners
+# and the collection only holds rooms which are still in use
+class RoomSweeper():
+    _instance = None
+
+    def __init__(self) -> None:
+        if RoomSweeper._instance is not None:
+            raise RuntimeError("Tried to initialize multiple instances of RoomSweeper.")
+        self.task: Optional[asyncio.Task] = None
+        self.swept_count = 0
+
+    @staticmethod
+    def get_instance() -> 'RoomSweeper':
+        if RoomSweeper._instance is None:
+            RoomSweeper._instance = RoomSweeper()
+        return RoomSweeper._instance
+
+    async def sweep(self, idle_timeout: float, unfilled_timeout: float) -> int:
+        # Active rooms only have their last activity in memory until the store is flushed
+        store = RoomStore.get_instance()
+        await store.flush()
+        count = await Room.delete_many(**get_expired_filter(idle_timeout=idle_timeout, unfilled_timeout=unfilled_timeout))
+        store.drop_expired(idle_timeout=idle_timeout, unfilled_timeout=unfilled_timeout)
+        self.swept_count += count
+        return count
+
+    def start(self, interval: float, idle_timeout: float, unfilled_timeout: float) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(interval=interval, idle_timeout=idle_timeout, unfilled_timeout=unfilled_timeout))
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self, interval: float, idle_timeout: float, unfilled_timeout: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                count = await self.sweep(idle_timeout=idle_timeout, unfilled_timeout=unfilled_timeout)
+                if count > 0:
+                    logger.info(f"Deleted {count} expired rooms.")
+            except Exception:
+                logger.exception("Failed to delete expired rooms.")
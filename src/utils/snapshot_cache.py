@@ -0,0 +1,37 @@
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Hashable
+from src.models.stats_models import CacheStats
+from src.utils.lru_cache import LRUCache
+
+# Shares short-lived results between callers, concurrent misses for the same key wait for a single load.
+# Loads run in an empty context, so they don't touch the unit of work of the request which started them.
+class SnapshotCache():
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.loads: dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        task = self.loads.get(key, None)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self.load(key=key, loader=loader), context=contextvars.Context())
+            self.loads[key] = task
+        # A cancelled caller must not cancel the load the other callers are waiting for
+        return await asyncio.shield(task)
+
+    async def load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            self.cache.put(key, value)
+            return value
+        finally:
+            self.loads.pop(key, None)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def get_stats(self) -> CacheStats:
+        return self.cache.get_stats()
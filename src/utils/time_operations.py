@@ -0,0 +1,9 @@
+from datetime import datetime, timezone
+
+# Naive UTC time for stored stamps, MongoDB reads naive datetimes as UTC, e.g. for TTL indexes
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Unix timestamp of a naive UTC stamp, timestamp() alone would read it as local time
+def utc_timestamp(stamp: datetime) -> int:
+    return int(stamp.replace(tzinfo=timezone.utc).timestamp())
@@ -1 +1 @@
-uvicorn server:api --reload --host 0.0.0.0 --port 8000
\ No newline at end of file
+uvicorn server:api --reload --host 0.0.0.0 --port 8000 --ws-ping-interval 20 --ws-ping-timeout 20
\ No newline at end of file
@@ -1,12 +1,20 @@
 import asyncio
+import os
 import pytest
 import pytest_asyncio
-from datetime import datetime
-from pymongo import MongoClient
 from httpx import AsyncClient
+from pymongo import MongoClient
 from server import api
+from src.database.backends.memory_backend import MemoryBackend
+from src.database.backends.motor_backend import MotorBackend
+from src.database.database import Database
+from src.entities.config import Config
+from src.entities.database_entity import DatabaseEntity
 from src.entities.user import User
 
+# Tests run against the in-process MemoryBackend, set TEST_DB_URL to run them against a MongoDB instance instead
+TEST_DB_URL = os.environ.get("TEST_DB_URL", None)
+
 def pytest_sessionstart(session):
     setup()
 
@@ -14,21 +22,29 @@ def pytest_sessionfinish(session, exitstatus):
     teardown()
 
 def setup():
-    client = MongoClient('mongodb://localhost:27017/')
-    client.drop_database('LemonTCG')
-    db = client['LemonTCG']
-    users_collection = db['users']
-
-    test1 = User.new("test-1", "1")
-    test2 = User.new("test-2", "2")
-    test3 = User.new("test-3", "3")
-    users_collection.insert_one(test1.model_dump(exclude={"id"}))
-    users_collection.insert_one(test2.model_dump(exclude={"id"}))
-    users_collection.insert_one(test3.model_dump(exclude={"id"}))
-    client.close()
+    database = Database.get_instance()
+    if TEST_DB_URL is None:
+        database.use_backend(MemoryBackend())
+    else:
+        drop_database()
+        backend = MotorBackend()
+        backend.connect(config=Config(db_url=TEST_DB_URL))
+        database.use_backend(backend)
+    asyncio.run(create_users())
+
+async def create_users():
+    await DatabaseEntity.create_indexes()
+    await User.new("test-1", "1").save()
+    await User.new("test-2", "2").save()
+    await User.new("test-3", "3").save()
 
 def teardown():
-    client = MongoClient('mongodb://localhost:27017/')
+    Database.get_instance().close()
+    if TEST_DB_URL is not None:
+        drop_database()
+
+def drop_database():
+    client = MongoClient(TEST_DB_URL)
     client.drop_database('LemonTCG')
     client.close()
 
@@ -57,4 +73,17 @@ def header2():
 
 @pytest.fixture(scope="function")
 def header3():
-    return {"X-API-Key": "3"}
\ No newline at end of file
+    return {"X-API-Key": "3"}
+
+
+# A fresh in-memory database holding only the test users, for tests which depend on every document of a collection
+@pytest_asyncio.fixture
+async def isolated_database():
+    database = Database.get_instance()
+    backend = database.backend
+    database.use_backend(MemoryBackend())
+    try:
+        await create_users()
+        yield database
+    finally:
+        database.use_backend(backend)
@@ -0,0 +1,130 @@
+import pytest
+from datetime import datetime
+from src.database.backends.memory_backend import MemoryBackend
+from src.database.collection import Collection
+from src.database.errors import UniqueKeyError
+from src.database.index import Index, ASCENDING, DESCENDING
+from src.entities.database_entity import DB, SCHEMA_FIELD
+from src.entities.unit_of_work import unit_of_work
+from src.entities.user import User
+
+@pytest.mark.asyncio
+async def test_memory_backend_unique_index():
+    backend = MemoryBackend()
+    await backend.create_indexes("users", [Index(fields=[("name", ASCENDING)], unique=True)])
+    await backend.insert_one("users", {"name": "a"})
+    document_id = await backend.insert_one("users", {"name": "b"})
+
+    with pytest.raises(UniqueKeyError) as e:
+        await backend.insert_one("users", {"name": "a"})
+    assert e.value.key == "name"
+    assert e.value.value == "a"
+
+    with pytest.raises(UniqueKeyError):
+        await backend.update_one("users", {"name": "b"}, {"$set": {"name": "a"}})
+
+    await backend.update_one("users", {"name": "b"}, {"$set": {"name": "c"}})
+    await backend.insert_one("users", {"name": "b"})
+    document = await backend.find_one("users", {"name": "c"})
+    assert str(document["_id"]) == document_id
+
+@pytest.mark.asyncio
+async def test_memory_backend_index_options():
+    backend = MemoryBackend()
+    await backend.create_indexes("rooms", [Index(fields=[("last_activity", ASCENDING)], expire_after_seconds=60)])
+    # Creating an index again with other options replaces it
+    await backend.create_indexes("rooms", [Index(fields=[("last_activity", ASCENDING)], expire_after_seconds=120)])
+    assert backend.indexes["rooms"]["last_activity_1"].expire_after_seconds == 120
+
+    await backend.create_indexes("rooms", [Index(fields=[("code", ASCENDING)])])
+    await backend.insert_one("rooms", {"code": "a"})
+    await backend.create_indexes("rooms", [Index(fields=[("code", ASCENDING)], unique=True)])
+    with pytest.raises(UniqueKeyError):
+        await backend.insert_one("rooms", {"code": "a"})
+
+@pytest.mark.asyncio
+async def test_memory_backend_queries():
+    backend = MemoryBackend()
+    for i in range(5):
+        await backend.insert_one("rooms", {"code": f"R{i}", "visible": i % 2 == 0, "players": i, "opponent": None if i < 3 else "x"})
+
+    codes = [document["code"] async for document in backend.find("rooms", {"visible": True}, sort=[("players", DESCENDING)])]
+    assert codes == ["R4", "R2", "R0"]
+
+    codes = [document["code"] async for document in backend.find("rooms", {"opponent": None, "players": {"$gte": 1}})]
+    assert codes == ["R1", "R2"]
+
+    codes = [document["code"] async for document in backend.find("rooms", {"$or": [{"code": {"$in": ["R0", "R3"]}}, {"players": {"$gt": 3}}]}, limit=2)]
+    assert codes == ["R0", "R3"]
+
+    document = await backend.find_one("rooms", {"code": "R1"}, projection={"code": 1})
+    assert set(document.keys()) == {"_id", "code"}
+
+@pytest.mark.asyncio
+async def test_memory_backend_updates():
+    backend = MemoryBackend()
+    stamp = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    await backend.insert_one("users", {"key": "1", "counters": {}, "friends": {"2": stamp}, "stamp": stamp})
+    await backend.update_one("users", {"key": "1"}, {
+        "$inc": {"counters.ping": 2},
+        "$unset": {"friends.2": ""},
+        "$max": {"stamp": datetime(2023, 1, 1)}
+    })
+    await backend.bulk_update("users", [({"key": "1"}, {"$inc": {"counters.ping": 1}, "$set": {"name": "one"}})])
+
+    document = await backend.find_one("users", {"key": "1"})
+    assert document["counters"] == {"ping": 3}
+    assert document["friends"] == {}
+    assert document["stamp"] == datetime(2024, 1, 1, 12, 0, 0, 123000)
+    assert document["name"] == "one"
+
+    document["name"] = "changed"
+    document = await backend.find_one("users", {"key": "1"})
+    assert document["name"] == "one"
+
+    await backend.delete_one("users", {"key": "1"})
+    assert await backend.find_one("users", {"key": "1"}) is None
+
+@pytest.mark.asyncio
+async def test_entity_hydration():
+    user = User.new("hydration-test")
+    user.friends["1"] = datetime.now()
+    await user.save()
+
+    loaded = await User.find_one(key=user.key)
+    assert loaded.get_changes() == {}
+    loaded.friends["2"] = datetime.now()
+    loaded.e2ee.public = "key"
+    changes = loaded.get_changes()
+    assert set(changes["$set"].keys()) == {"friends.2", "e2ee.public"}
+
+    # Documents without the current schema version are validated and upgraded with their next save
+    await DB.update(collection=Collection.USERS, document_id=user.id, update={"$unset": {SCHEMA_FIELD: ""}})
+    legacy = await User.find_one(key=user.key)
+    assert legacy.get_changes() == {"$set": {SCHEMA_FIELD: User.SCHEMA_VERSION}}
+
+@pytest.mark.asyncio
+async def test_unit_of_work_rollback():
+    # A request which fails halfway writes nothing
+    dependency = unit_of_work()
+    unit = await anext(dependency)
+    user = await User.find_one(key="3")
+    user.display_name = "Changed"
+    await user.save()
+    assert len(unit.pending) == 1
+    with pytest.raises(RuntimeError):
+        await dependency.athrow(RuntimeError("Request failed."))
+    assert len(unit.pending) == 0
+    assert (await User.find_one(key="3")).display_name != "Changed"
+
+    dependency = unit_of_work()
+    await anext(dependency)
+    user = await User.find_one(key="3")
+    display_name = user.display_name
+    user.display_name = "Changed"
+    await user.save()
+    with pytest.raises(StopAsyncIteration):
+        await anext(dependency)
+    assert (await User.find_one(key="3")).display_name == "Changed"
+    user.display_name = display_name
+    await user.save()
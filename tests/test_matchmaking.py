@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+from src.entities.room import MAX_ROOM_COUNT, Room, generate_code
+from src.models.matchmaking_models import MatchmakingStatus
+from src.models.room_models import RoomInformation
+from src.services.matchmaking import Matchmaker
+
+@pytest.mark.asyncio
+async def test_matchmaking(client: AsyncClient, header1: dict, header2: dict):
+    response = await client.post("/matchmaking/")
+    assert response.status_code == 403
+
+    response = await client.post("/matchmaking/", headers=header1)
+    assert response.status_code == 200
+    assert MatchmakingStatus.model_validate(response.json()).state == "queued"
+
+    response = await client.get("/matchmaking/", headers=header1)
+    assert MatchmakingStatus.model_validate(response.json()).state == "queued"
+
+    response = await client.post("/matchmaking/", headers=header2)
+    assert response.status_code == 200
+    matched = MatchmakingStatus.model_validate(response.json())
+    assert matched.state == "matched"
+
+    response = await client.get("/matchmaking/", headers=header1)
+    assert MatchmakingStatus.model_validate(response.json()) == matched
+
+    response = await client.get("/room/status", params={"code": matched.code}, headers=header1)
+    assert response.status_code == 200
+    information = RoomInformation.model_validate(response.json())
+    assert information.owner_name == "test-1"
+    assert information.opponent_name == "test-2"
+
+    assert Matchmaker.get_instance().get_stats().matches >= 1
+
+@pytest.mark.asyncio
+async def test_matchmaking_rating(client: AsyncClient, header1: dict, header2: dict, header3: dict):
+    response = await client.post("/matchmaking/", params={"rating": 150}, headers=header1)
+    assert MatchmakingStatus.model_validate(response.json()).state == "queued"
+
+    # Too far apart
+    response = await client.post("/matchmaking/", params={"rating": 1000}, headers=header2)
+    assert MatchmakingStatus.model_validate(response.json()).state == "queued"
+
+    response = await client.delete("/matchmaking/", headers=header2)
+    assert response.status_code == 200
+    response = await client.delete("/matchmaking/", headers=header2)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Not in queue."}
+
+    # Neighbouring bucket
+    response = await client.post("/matchmaking/", params={"rating": 260}, headers=header3)
+    assert MatchmakingStatus.model_validate(response.json()).state == "matched"
+
+@pytest.mark.asyncio
+async def test_matchmaking_guards(monkeypatch: pytest.MonkeyPatch):
+    matchmaker = Matchmaker.get_instance()
+    # A repeated request while the first one is still creating the room must not pair the player twice
+    release = asyncio.Event()
+    insert_with_unique_code = Room.insert_with_unique_code
+    async def slow_insert_with_unique_code(room: Room) -> None:
+        await release.wait()
+        await insert_with_unique_code(room)
+    monkeypatch.setattr(Room, "insert_with_unique_code", slow_insert_with_unique_code)
+    assert (await matchmaker.enqueue(key="guard-1", rating=5000)).state == "queued"
+    first = asyncio.create_task(matchmaker.enqueue(key="guard-2", rating=5000))
+    await asyncio.sleep(0.01)
+    assert (await matchmaker.enqueue(key="guard-2", rating=5000)).state == "queued"
+    assert (await matchmaker.enqueue(key="guard-1", rating=5000)).state == "queued"
+    release.set()
+    assert (await first).state == "matched"
+    assert matchmaker.get_status("guard-2") == matchmaker.get_status("guard-1")
+    assert await Room.count(owner_key="guard-1") == 1
+
+    # Players who waited too long are dropped instead of being matched
+    assert (await matchmaker.enqueue(key="guard-3", rating=6000)).state == "queued"
+    monkeypatch.setattr(matchmaker, "queue_timeout", -1.0)
+    assert matchmaker.get_status("guard-3").state == "idle"
+    monkeypatch.setattr(matchmaker, "queue_timeout", 120.0)
+    assert (await matchmaker.enqueue(key="guard-4", rating=6000)).state == "queued"
+    matchmaker.dequeue("guard-4")
+
+    # Players at the room limit can't queue
+    for _ in range(MAX_ROOM_COUNT):
+        await Room(owner_key="guard-5", code=generate_code()).insert_with_unique_code()
+    assert await matchmaker.enqueue(key="guard-5", rating=7000) is None
+    assert matchmaker.get_status("guard-5").state == "idle"
@@ -1,5 +1,11 @@
 import pytest
 from httpx import AsyncClient
+from src.auth.auth_cache import AuthCache
+from src.database.collection import Collection
+from src.database.database import Database
+from src.entities.user import User
+from src.models.stats_models import ServerStats
+from src.services.endpoint_usage import EndpointUsageTracker
 
 @pytest.mark.asyncio
 async def test_get_ping(client: AsyncClient, header1: dict, header2: dict):
@@ -12,4 +18,87 @@ async def test_get_ping(client: AsyncClient, header1: dict, header2: dict):
 
     response = await client.get("/ping", headers=header2)
     assert response.status_code == 200
-    assert response.json() == {"message": "Pong"}
\ No newline at end of file
+    assert response.json() == {"message": "Pong"}
+
+@pytest.mark.asyncio
+async def test_endpoint_usage(client: AsyncClient, header3: dict, monkeypatch: pytest.MonkeyPatch):
+    usage_tracker = EndpointUsageTracker.get_instance()
+    user = await User.find_one(key="3")
+    previous_count = user.used_endpoints.get("get-ping", 0)
+
+    response = await client.get("/ping", headers=header3)
+    assert response.status_code == 200
+    response = await client.get("/ping", headers=header3)
+    assert response.status_code == 200
+    assert usage_tracker.used_endpoints["3"]["get-ping"] == 2
+
+    # Usage which could not be written is kept for the next flush
+    database = Database.get_instance()
+    async def failing_bulk_update(collection: Collection, operations: list[tuple[dict, dict]]) -> None:
+        raise RuntimeError("Database unavailable.")
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "bulk_update", failing_bulk_update)
+        with pytest.raises(RuntimeError):
+            await usage_tracker.flush()
+    assert usage_tracker.used_endpoints["3"]["get-ping"] == 2
+
+    await usage_tracker.flush()
+    assert usage_tracker.get_pending_count() == 0
+    user = await User.find_one(key="3")
+    assert user.used_endpoints["get-ping"] == previous_count + 2
+    assert user.last_access_stamp > user.created_stamp
+
+
+@pytest.mark.asyncio
+async def test_get_stats(client: AsyncClient, header1: dict):
+    response = await client.get("/stats")
+    assert response.status_code == 403
+
+    response = await client.get("/ping", headers=header1)
+    assert response.status_code == 200
+
+    response = await client.get("/stats", headers=header1)
+    assert response.status_code == 200
+    stats = ServerStats.model_validate(response.json())
+    assert stats.auth_cache.size > 0
+    assert stats.auth_cache.hits > 0
+    assert stats.pm.connections == 0
+
+
+@pytest.mark.asyncio
+async def test_invalid_key_cache(client: AsyncClient):
+    invalid_keys = AuthCache.get_instance().invalid_keys
+    previous_hits = invalid_keys.hits
+
+    response = await client.get("/ping", headers={"X-API-Key": "invalid-key"})
+    assert response.status_code == 403
+    response = await client.get("/ping", headers={"X-API-Key": "invalid-key"})
+    assert response.status_code == 403
+    assert invalid_keys.hits == previous_hits + 1
+
+    response = await client.get("/ping", headers={"X-API-Key": "x" * 1000})
+    assert response.status_code == 403
+
+    # Creating a user with a previously rejected key makes it valid right away
+    await User.new("invalid-key-user", "invalid-key").save()
+    response = await client.get("/ping", headers={"X-API-Key": "invalid-key"})
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_auth_cache_concurrent_write(monkeypatch: pytest.MonkeyPatch):
+    auth_cache = AuthCache.get_instance()
+    auth_cache.users.invalidate("3")
+    find_one = User.find_one
+    # The user is written after it was read, but before the read finished
+    async def racing_find_one(**kwargs) -> User:
+        user = await find_one(**kwargs)
+        (await find_one(key="3")).notify_write()
+        return user
+    monkeypatch.setattr(User, "find_one", racing_find_one)
+    assert isinstance(await auth_cache.get_user("3"), User)
+    assert auth_cache.users.get("3") is None
+    assert len(auth_cache.loads) == 0 and len(auth_cache.generations) == 0
+
+    monkeypatch.setattr(User, "find_one", find_one)
+    await auth_cache.get_user("3")
+    assert auth_cache.users.get("3") is not None
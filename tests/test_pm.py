@@ -1,52 +1,310 @@
+import asyncio
 import pytest
-import websockets
-from datetime import datetime
-from src.models.pm_models import WsRcvMessage, WsResponse
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from server import api
+from src.database.collection import Collection
+from src.database.database import Database
+from src.entities.message import Message
+from src.entities.user import User
+from src.models.pm_models import InboxPage, PmDelivery, WsRcvMessage, WsResponse
+from src.resources.pm import drain_inbox
+from src.services.backplanes.database_backplane import DatabaseBackplane, PRESENCE_EXPIRY
+from src.services.message_writer import MessageWriter
+from src.services.pm_hub import PmHub
+from src.services.pm_session import PmSession
+from src.services.receiver_cache import ReceiverCache
+from src.utils.time_operations import utc_now
+
+def test_pm_websocket(header1: dict, header2: dict):
+    # Sockets of different users have to share one event loop, the lifespan provides it and closes the database on exit
+    database = Database.get_instance()
+    backend = database.backend
+    try:
+        with TestClient(api) as client:
+            with pytest.raises(WebSocketDisconnect) as e:
+                with client.websocket_connect("/pm/ws"):
+                    pass
+            assert e.value.code == 1008
+
+            with pytest.raises(WebSocketDisconnect) as e:
+                with client.websocket_connect("/pm/ws", headers={"X-API-Key": "Dongo"}):
+                    pass
+            assert e.value.code == 1008
+    
+            with client.websocket_connect("/pm/ws", headers=header1) as websocket1:
+                with client.websocket_connect("/pm/ws", headers=header2) as websocket2:
+                    # Invalid meshsage body
+                    websocket1.send_text("{'lol': 'pog'}")
+                    response = WsResponse.model_validate_json(websocket1.receive_text())
+                    assert response.code == 1
+                    assert response.message == "Invalid message body."
+
+                    # Invalid user
+                    message = WsRcvMessage(receiver_username="no-name", encrypted_content="You're an idiot >:)", sent_stamp=int(datetime.now().timestamp()))
+                    websocket1.send_text(message.model_dump_json())
+                    response = WsResponse.model_validate_json(websocket1.receive_text())
+                    assert response.code == 2
+                    assert response.message == "User not found."
+
+                    # Simple message
+                    message = WsRcvMessage(receiver_username="test-2", encrypted_content="You're an idiot >:)", sent_stamp=int(datetime.now().timestamp()))
+                    websocket1.send_text(message.model_dump_json())
+                    response = WsResponse.model_validate_json(websocket1.receive_text())
+                    assert response.code == 3
+                    assert response.message == "Message delivered."
+
+                    received_message = WsResponse.model_validate_json(websocket2.receive_text())
+                    assert received_message.code == 4
+                    assert received_message.message == "You're an idiot >:)"
+                    assert received_message.sender_name == "test-1"
+                    assert received_message.sender_public_key == "public"
+    finally:
+        database.use_backend(backend)
+
+def test_pm_multi_device(header1: dict, header2: dict):
+    database = Database.get_instance()
+    backend = database.backend
+    try:
+        with TestClient(api) as client:
+            with client.websocket_connect("/pm/ws", headers=header1) as websocket1:
+                with client.websocket_connect("/pm/ws", headers=header2) as phone, client.websocket_connect("/pm/ws", headers=header2) as desktop:
+                    assert len(PmHub.get_instance().connections["test-2"]) == 2
+                    message = WsRcvMessage(receiver_username="test-2", encrypted_content="Both devices", sent_stamp=int(datetime.now().timestamp()))
+                    websocket1.send_text(message.model_dump_json())
+                    assert WsResponse.model_validate_json(websocket1.receive_text()).code == 3
+                    assert WsResponse.model_validate_json(phone.receive_text()).message == "Both devices"
+                    assert WsResponse.model_validate_json(desktop.receive_text()).message == "Both devices"
+    finally:
+        database.use_backend(backend)
+
+def test_inbox(header1: dict, header3: dict):
+    database = Database.get_instance()
+    backend = database.backend
+    # Messages are acknowledged once they are stored, so they show up in the inbox right away
+    writer = MessageWriter.get_instance()
+    writer.durable_ack = True
+    try:
+        with TestClient(api) as client:
+            # Messages to offline users end up in their inbox
+            with client.websocket_connect("/pm/ws", headers=header1) as websocket:
+                for content in ["First", "Second", "Third"]:
+                    message = WsRcvMessage(receiver_username="test-3", encrypted_content=content, sent_stamp=int(datetime.now().timestamp()))
+                    websocket.send_text(message.model_dump_json())
+                    assert WsResponse.model_validate_json(websocket.receive_text()).code == 3
+
+            response = client.get("/inbox/", params={"limit": 2}, headers=header3)
+            assert response.status_code == 200
+            page = InboxPage.model_validate(response.json())
+            assert [message.content for message in page.messages] == ["First", "Second"]
+            assert page.messages[0].sender_name == "test-1"
+            assert page.cursor is not None
+
+            # Only the receiver can mark messages as read
+            ids = [message.id for message in page.messages]
+            response = client.post("/inbox/read", params={"ids": ids}, headers=header1)
+            assert response.json() == {"message": "Marked 0 messages as read."}
+            response = client.post("/inbox/read", params={"ids": ids}, headers=header3)
+            assert response.json() == {"message": "Marked 2 messages as read."}
+            response = client.post("/inbox/read", params={"ids": ["invalid"]}, headers=header3)
+            assert response.status_code == 400
+
+            # The rest is delivered on connect
+            with client.websocket_connect("/pm/ws", headers=header3) as websocket:
+                received_message = WsResponse.model_validate_json(websocket.receive_text())
+                assert received_message.code == 4
+                assert received_message.message == "Third"
+
+            response = client.get("/inbox/", headers=header3)
+            assert InboxPage.model_validate(response.json()).messages == []
+    finally:
+        writer.durable_ack = False
+        database.use_backend(backend)
 
 @pytest.mark.asyncio
-async def test_pm_websocket(header1: dict, header2: dict):
-    uri = "ws://localhost:8000/pm/ws"
+async def test_receiver_cache():
+    cache = ReceiverCache.get_instance()
+    receiver = await cache.get_receiver(name="Test-2")
+    assert receiver.key == "2"
+
+    hits = cache.receivers.hits
+    assert await cache.get_receiver(name="test-2") == receiver
+    assert cache.receivers.hits == hits + 1
+    assert await cache.get_receiver(name="no-name") is None
+
+    # Writing the user drops the entry
+    user = await User.find_one(name="test-2")
+    await user.save()
+    assert cache.receivers.get("test-2") is None
+
+@pytest.mark.asyncio
+async def test_database_backplane():
+    received = []
+    async def handler(delivery: PmDelivery) -> None:
+        received.append(delivery)
+    worker1 = DatabaseBackplane(worker_id="worker-1", handler=handler, poll_interval=1.0)
+    worker2 = DatabaseBackplane(worker_id="worker-2", handler=handler, poll_interval=1.0)
+
+    await worker2.register("test-2")
+    assert await worker1.locate("test-2") == ["worker-2"]
+
+    delivery = PmDelivery(receiver_name="test-2", message_id="0" * 24, payload="Hello")
+    await worker1.publish("worker-2", delivery)
+    assert await worker1.poll() == 0
+    assert await worker2.poll() == 1
+    assert received == [delivery]
+    assert await worker2.poll() == 0
+
+    # Devices of one user on several workers, a worker only removes its own entry
+    await worker1.register("test-2")
+    await worker1.register("test-2")
+    assert sorted(await worker1.locate("test-2")) == ["worker-1", "worker-2"]
+    await worker2.unregister("test-2")
+    assert await worker1.locate("test-2") == ["worker-1"]
+    await worker1.unregister("test-2")
+    assert await worker1.locate("test-2") == []
 
+    # Entries of a worker which stopped refreshing them are ignored
+    await worker2.register("test-2")
+    stale = utc_now() - timedelta(seconds=PRESENCE_EXPIRY + 1)
+    await Database.get_instance().update_many(collection=Collection.PRESENCE, update={"$set": {"last_seen": stale}}, worker="worker-2")
+    assert await worker1.locate("test-2") == []
+    assert await worker2.refresh() == 1
+    assert await worker1.locate("test-2") == ["worker-2"]
+    await worker2.unregister("test-2")
+
+@pytest.mark.asyncio
+async def test_message_writer():
+    writer = MessageWriter.get_instance()
+    writer.start()
     try:
-        async with websockets.connect(uri):
-            pass
-    except websockets.InvalidStatusCode as e:
-        assert e.status_code == 403
+        written_count = writer.written_count
+        messages = [Message(content=f"Message {i}", sender_key="1", receiver_key="2", sent_stamp=i) for i in range(3)]
+        for message in messages[:-1]:
+            await writer.submit(message=message)
+        # Waiting for the last message also waits for the batch the others are part of
+        await writer.submit(message=messages[-1], wait=True)
+        assert writer.written_count == written_count + 3
+        assert (await Message.find_one(content="Message 0")).id == messages[0].id
+    finally:
+        await writer.stop()
 
+@pytest.mark.asyncio
+async def test_message_writer_retry(monkeypatch: pytest.MonkeyPatch):
+    writer = MessageWriter.get_instance()
+    insert_many = Message.insert_many
+    failures = [RuntimeError("Database unavailable.")]
+    async def flaky_insert_many(entities: list[Message]) -> None:
+        if len(failures) > 0:
+            raise failures.pop()
+        await insert_many(entities)
+    monkeypatch.setattr(Message, "insert_many", flaky_insert_many)
+    monkeypatch.setattr(writer, "retry_delay", 0.001)
+    writer.start()
     try:
-        async with websockets.connect(uri, extra_headers={"X-API-Key": "Dongo"}):
-            pass
-    except websockets.InvalidStatusCode as e:
-        assert e.status_code == 403
-    
-    async with websockets.connect(uri, extra_headers=header1) as websocket1:
-        async with websockets.connect(uri, extra_headers=header2) as websocket2:
-            # Invalid meshsage body
-            await websocket1.send("{'lol': 'pog'}")
-            response_json = await websocket1.recv()
-            response = WsResponse.model_validate_json(response_json)
-            assert response.code == 1
-            assert response.message == "Invalid message body."
-
-            # Invalid user
-            message = WsRcvMessage(receiver_username="no-name", encrypted_content="You're an idiot >:)", sent_stamp=int(datetime.now().timestamp()))
-            await websocket1.send(message.model_dump_json())
-            response_json = await websocket1.recv()
-            response = WsResponse.model_validate_json(response_json)
-            assert response.code == 2
-            assert response.message == "User not found."
-
-            # Simple message
-            message = WsRcvMessage(receiver_username="test-2", encrypted_content="You're an idiot >:)", sent_stamp=int(datetime.now().timestamp()))
-            await websocket1.send(message.model_dump_json())
-            response_json = await websocket1.recv()
-            response = WsResponse.model_validate_json(response_json)
-            assert response.code == 3
-            assert response.message == "Message delivered."
-
-            received = await websocket2.recv()
-            received_message = WsResponse.model_validate_json(received)
-            assert received_message.code == 4
-            assert received_message.message == "You're an idiot >:)"
-            assert received_message.sender_name == "test-1"
-            assert received_message.sender_public_key == "public"
\ No newline at end of file
+        retry_count = writer.retry_count
+        message = Message(content="Retried", sender_key="1", receiver_key="2", sent_stamp=0, read=True, read_stamp=0)
+        await writer.submit(message=message)
+        # The receiver disconnected before the message was sent and stored
+        await writer.mark_unread_many([message.id])
+        await writer.submit(message=Message(content="Retried too", sender_key="1", receiver_key="2", sent_stamp=0), wait=True)
+        assert writer.retry_count == retry_count + 1
+        stored = await Message.find_one(content="Retried")
+        assert stored.id == message.id
+        assert not stored.read
+        assert len(writer.pending) == 0
+    finally:
+        await writer.stop()
+
+
+# Websocket of a receiver which never reads unless it is told otherwise
+class StalledWebSocket():
+    def __init__(self, stalled: bool = True) -> None:
+        self.stalled = stalled
+        self.sent: list[str] = []
+        self.closed_code = None
+
+    async def send_text(self, data: str) -> None:
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.sent.append(data)
+
+    async def close(self, code: int, reason: str) -> None:
+        self.closed_code = code
+
+@pytest.mark.asyncio
+async def test_pm_session():
+    # The writer holds the first message, the queue the second
+    for policy in ["drop", "spill", "disconnect"]:
+        websocket = StalledWebSocket()
+        session = PmSession(name="user", websocket=websocket, queue_size=1, send_timeout=10.0, overflow_policy=policy)
+        session.start()
+        assert session.offer(payload="1", message_id="a")
+        await asyncio.sleep(0)
+        assert session.offer(payload="2", message_id="b")
+        assert not session.offer(payload="3", message_id="c")
+        await asyncio.sleep(0)
+        assert websocket.closed_code == (1013 if policy == "disconnect" else None)
+        assert await session.stop() == ["a", "b"]
+
+    # A receiver which stops reading is disconnected once a send times out
+    websocket = StalledWebSocket()
+    session = PmSession(name="user", websocket=websocket, queue_size=1, send_timeout=0.01, overflow_policy="spill")
+    session.start()
+    await session.send("1")
+    await asyncio.sleep(0.05)
+    assert websocket.closed_code == 1011
+    assert not session.offer(payload="2")
+    await session.stop()
+
+    with pytest.raises(RuntimeError):
+        PmSession(name="user", websocket=websocket, queue_size=1, send_timeout=10.0, overflow_policy="block")
+
+@pytest.mark.asyncio
+async def test_pm_reap():
+    hub = PmHub.get_instance()
+    alive, dead = StalledWebSocket(stalled=False), StalledWebSocket()
+    alive_session = await hub.connect(name="reap", websocket=alive)
+    dead_session = await hub.connect(name="reap", websocket=dead)
+    try:
+        # The send to the dead socket times out and closes its session
+        dead_session.send_timeout = 0.01
+        assert hub.send_local(name="reap", payload="Hello")
+        await asyncio.sleep(0.05)
+        assert dead.closed_code == 1011
+        assert alive.sent == ["Hello"]
+
+        reaped_count = hub.reaped_count
+        assert await hub.reap() == 1
+        assert hub.connections["reap"] == [alive_session]
+        assert hub.get_stats().reaped == reaped_count + 1
+
+        # Disconnecting a reaped session again does nothing
+        await hub.disconnect(dead_session)
+        assert hub.connections["reap"] == [alive_session]
+    finally:
+        await hub.disconnect(alive_session)
+    assert not hub.is_connected("reap")
+
+@pytest.mark.asyncio
+async def test_drain_inbox_unsent():
+    receiver = User.new("drain-user", "drain")
+    messages = [Message(content=f"Offline {i}", sender_key="1", receiver_key=receiver.key, sent_stamp=i) for i in range(2)]
+    await Message.insert_many(messages)
+
+    # The first message is being sent and the second one queued when the receiver goes away
+    session = PmSession(name=receiver.name, websocket=StalledWebSocket(), queue_size=1, send_timeout=10.0, overflow_policy="spill")
+    session.start()
+    await drain_inbox(receiver=receiver, session=session)
+    assert len((await Message.get_inbox(receiver_key=receiver.key, limit=10))[0]) == 0
+    unsent = await session.stop()
+    assert unsent == [message.id for message in messages]
+    await MessageWriter.get_instance().mark_unread_many(unsent)
+    assert len((await Message.get_inbox(receiver_key=receiver.key, limit=10))[0]) == 2
+
+    # Nothing is marked as read for a session which closed before the inbox was drained
+    session = PmSession(name=receiver.name, websocket=StalledWebSocket(), queue_size=1, send_timeout=10.0, overflow_policy="spill")
+    await session.stop()
+    await drain_inbox(receiver=receiver, session=session)
+    assert len((await Message.get_inbox(receiver_key=receiver.key, limit=10))[0]) == 2
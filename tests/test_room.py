@@ -1,7 +1,17 @@
+import asyncio
 import pytest
+import time
+from datetime import datetime
+from fastapi.testclient import TestClient
 from httpx import AsyncClient
-from src.entities.room import MAX_ROOM_COUNT
-from src.models.room_models import RoomCreationSuccess, RoomInformation
+from starlette.websockets import WebSocketDisconnect
+from server import api
+from src.database.database import Database
+from src.entities.room import MAX_ROOM_COUNT, Room
+from src.models.room_models import RoomCreationSuccess, RoomInformation, RoomList
+from src.services.room_browser import RoomBrowser
+from src.services.room_store import RoomStore
+from src.services.room_sweeper import RoomSweeper
 
 @pytest.fixture
 async def room(client: AsyncClient, header1: dict):
@@ -39,6 +49,17 @@ async def test_room_status(client: AsyncClient, header1: dict, room):
     assert response.status_code == 200
     assert response.json() == {"message": "Room closed."}
 
+def test_room_created_stamp(monkeypatch: pytest.MonkeyPatch):
+    # Stamps are stored as naive UTC, the reported unix time must not depend on the local timezone
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    try:
+        room = Room(code="ABCDEF", owner_key="1", created_stamp=datetime(2024, 1, 1))
+        assert room.build_information(participants={}).created_stamp == 1704067200
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
 @pytest.mark.asyncio
 async def test_room_leave(client: AsyncClient, header1: dict, header2: dict, room):
     code = await room
@@ -166,6 +187,117 @@ async def test_room_ready(client: AsyncClient, header1: dict, header2: dict, roo
     assert response.status_code == 200
     assert response.json() == {"message": "Room closed."}
 
+def test_room_websocket(header1: dict, header2: dict, header3: dict):
+    # The lifespan keeps http requests and websockets on one event loop, it closes the database on exit
+    database = Database.get_instance()
+    backend = database.backend
+    try:
+        with TestClient(api) as client:
+            response = client.post("/room/create", headers=header1)
+            code = RoomCreationSuccess.model_validate(response.json()).code
+
+            with pytest.raises(WebSocketDisconnect) as e:
+                with client.websocket_connect("/room/ws", params={"code": code}):
+                    pass
+            assert e.value.code == 1008
+
+            with pytest.raises(WebSocketDisconnect) as e:
+                with client.websocket_connect("/room/ws", params={"code": code}, headers=header3):
+                    pass
+            assert e.value.code == 4004
+
+            with client.websocket_connect("/room/ws", params={"code": code}, headers=header1) as websocket:
+                information = RoomInformation.model_validate_json(websocket.receive_text())
+                assert information.code == code
+                assert information.opponent_name is None
+
+                client.post("/room/join", params={"code": code}, headers=header2)
+                information = RoomInformation.model_validate_json(websocket.receive_text())
+                assert information.opponent_name == "test-2"
+
+                client.post("/room/ready", params={"code": code, "state": True}, headers=header2)
+                information = RoomInformation.model_validate_json(websocket.receive_text())
+                assert information.opponent_ready
+
+                client.post("/room/leave", params={"code": code}, headers=header1)
+                with pytest.raises(WebSocketDisconnect) as e:
+                    websocket.receive_text()
+                assert e.value.code == 1000
+    finally:
+        database.use_backend(backend)
+
+@pytest.mark.asyncio
+async def test_room_write_behind(client: AsyncClient, header2: dict, header3: dict):
+    response = await client.post("/room/create", headers=header2)
+    code = RoomCreationSuccess.model_validate(response.json()).code
+    response = await client.post("/room/join", params={"code": code}, headers=header3)
+    assert response.status_code == 204
+
+    # The join is only in memory until the store is flushed
+    room = await Room.find_one(code=code)
+    assert room.opponent_key is None
+    response = await client.get("/room/status", params={"code": code}, headers=header2)
+    assert RoomInformation.model_validate(response.json()).opponent_name == "test-3"
+
+    await RoomStore.get_instance().flush()
+    room = await Room.find_one(code=code)
+    assert room.opponent_key == "3"
+
+    response = await client.post("/room/leave", params={"code": code}, headers=header2)
+    assert response.status_code == 200
+    assert await Room.find_one(code=code) is None
+
+@pytest.mark.asyncio
+async def test_room_store_locks(client: AsyncClient, header3: dict):
+    # Requests for unknown rooms leave no locks behind
+    for i in range(10):
+        response = await client.post("/room/join", params={"code": f"X{i}"}, headers=header3)
+        assert response.status_code == 404
+    assert len(RoomStore.get_instance().locks) == 0
+
+@pytest.mark.asyncio
+async def test_room_store_write_through(client: AsyncClient, header2: dict, header3: dict):
+    # With several processes changes go to the database right away and rooms are never served from memory
+    store = RoomStore.get_instance()
+    store.write_through = True
+    try:
+        response = await client.post("/room/create", headers=header2)
+        code = RoomCreationSuccess.model_validate(response.json()).code
+        response = await client.post("/room/join", params={"code": code}, headers=header3)
+        assert response.status_code == 204
+        assert code not in store.rooms and len(store.dirty) == 0
+        room = await Room.find_one(code=code)
+        assert room.opponent_key == "3"
+
+        # Changes of another process are seen on the next request
+        room.opponent_key = None
+        await room.write()
+        response = await client.post("/room/ready", params={"code": code, "state": True}, headers=header3)
+        assert response.status_code == 400
+
+        response = await client.post("/room/leave", params={"code": code}, headers=header2)
+        assert response.status_code == 200
+    finally:
+        store.write_through = False
+
+@pytest.mark.asyncio
+async def test_room_store_stop(client: AsyncClient, header2: dict, header3: dict):
+    store = RoomStore.get_instance()
+    response = await client.post("/room/create", headers=header2)
+    code = RoomCreationSuccess.model_validate(response.json()).code
+    store.start(interval=60.0)
+    response = await client.post("/room/join", params={"code": code}, headers=header3)
+    assert response.status_code == 204
+
+    # Stopping writes the changes which are still pending
+    await store.stop()
+    assert store.task is None
+    room = await Room.find_one(code=code)
+    assert room.opponent_key == "3"
+
+    response = await client.post("/room/leave", params={"code": code}, headers=header2)
+    assert response.status_code == 200
+
 @pytest.mark.asyncio
 async def test_room_limit(client: AsyncClient, header1: dict):
     for _ in range(MAX_ROOM_COUNT):
@@ -173,4 +305,67 @@ async def test_room_limit(client: AsyncClient, header1: dict):
 
     response = await client.post("/room/create", headers=header1)
     assert response.status_code == 400
-    assert response.json() == {"detail": "Maximum room limit reached."}
\ No newline at end of file
+    assert response.json() == {"detail": "Maximum room limit reached."}
+
+@pytest.mark.asyncio
+async def test_room_expiry(client: AsyncClient, header2: dict, header3: dict, isolated_database: Database):
+    response = await client.post("/room/create", headers=header2)
+    assert response.status_code == 201
+    code = RoomCreationSuccess.model_validate(response.json()).code
+
+    # A room whose opponent left is still in use
+    response = await client.post("/room/create", headers=header3)
+    filled_code = RoomCreationSuccess.model_validate(response.json()).code
+    response = await client.post("/room/join", params={"code": filled_code}, headers=header2)
+    assert response.status_code == 204
+    response = await client.post("/room/leave", params={"code": filled_code}, headers=header2)
+    assert response.status_code == 200
+
+    sweeper = RoomSweeper.get_instance()
+    await sweeper.sweep(idle_timeout=3600, unfilled_timeout=900)
+    response = await client.get("/room/status", params={"code": code}, headers=header2)
+    assert response.status_code == 200
+
+    await asyncio.sleep(0.01)
+    assert await sweeper.sweep(idle_timeout=3600, unfilled_timeout=0) == 1
+    response = await client.get("/room/status", params={"code": code}, headers=header2)
+    assert response.status_code == 404
+    response = await client.get("/room/status", params={"code": filled_code}, headers=header3)
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_room_list(client: AsyncClient, header1: dict, header2: dict, header3: dict, isolated_database: Database):
+    pages = RoomBrowser.get_instance().pages
+    pages.clear()
+
+    response = await client.get("/room/list")
+    assert response.status_code == 403
+
+    await client.post("/room/create", headers=header2)
+    codes = []
+    for header in [header2, header3]:
+        response = await client.post("/room/create", params={"visible": True}, headers=header)
+        codes.append(RoomCreationSuccess.model_validate(response.json()).code)
+
+    response = await client.get("/room/list", params={"limit": 1}, headers=header1)
+    assert response.status_code == 200
+    page = RoomList.model_validate(response.json())
+    assert [room.code for room in page.rooms] == [codes[1]]
+    assert page.rooms[0].owner_name == "test-3"
+    assert page.cursor is not None
+
+    # The same page is served from the snapshot
+    hits = pages.cache.hits
+    response = await client.get("/room/list", params={"limit": 1}, headers=header2)
+    assert RoomList.model_validate(response.json()) == page
+    assert pages.cache.hits == hits + 1
+
+    response = await client.get("/room/list", params={"limit": 1, "cursor": page.cursor}, headers=header1)
+    assert response.status_code == 200
+    page = RoomList.model_validate(response.json())
+    assert [room.code for room in page.rooms] == [codes[0]]
+    assert page.cursor is None
+
+    response = await client.get("/room/list", params={"cursor": "invalid"}, headers=header1)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor."}